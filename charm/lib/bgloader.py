@@ -0,0 +1,92 @@
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Any, Callable, Hashable, Optional
+
+
+def failed(future: Future) -> bool:
+    """
+    Whether a future is finished without a result, so it's no good to pick up
+    """
+    return future.cancelled() or (future.done() and future.exception() is not None)
+
+
+class BackgroundLoader:
+    """
+    Runs slow loads (like parsing a chart) off the main loop, and hands back the result of the newest one once it's done
+    Submitting a new load cancels the previous one: if it hasn't started it never will, and if it has, its result is thrown away
+    The default executor is a small process pool, so parsing doesn't fight the render loop for the GIL
+    Loads can also be started speculatively with prefetch(), and the newest `prefetch_size` of them are kept around
+    until a submit() with the same key picks one up
+    """
+    def __init__(self, executor: Optional[Executor] = None, max_workers: int = 2, prefetch_size: int = 2):
+        self.executor = executor
+        self.max_workers = max_workers
+        self.prefetch_size = prefetch_size
+        self.prefetched: OrderedDict[Hashable, Future] = OrderedDict()
+        self.future: Optional[Future] = None
+        self.context: Any = None
+
+    @property
+    def loading(self) -> bool:
+        return self.future is not None
+
+    def start(self, fn: Callable, *args, **kwargs) -> Future:
+        # Workers are only started the first time something is loaded
+        # Spawned rather than forked, so the workers don't inherit the game's window and audio
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def submit(self, fn: Callable, *args, context: Any = None, key: Hashable = None, **kwargs):
+        """
+        Start loading fn(*args, **kwargs) in the background, or pick up the prefetched load for key if there is one
+        context is handed back alongside the result, to remember what the load was for
+        """
+        self.cancel()
+        future = self.prefetched.pop(key, None)
+        if future is None or failed(future):
+            future = self.start(fn, *args, **kwargs)
+        self.future = future
+        self.context = context
+
+    def prefetch(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """
+        Start loading fn(*args, **kwargs) in the background in case it's wanted soon, unless key is already prefetched
+        A prefetch that failed is started again, the failure might have been temporary
+        The least recently prefetched load is dropped once there are more than prefetch_size
+        """
+        if key in self.prefetched and not failed(self.prefetched[key]):
+            self.prefetched.move_to_end(key)
+            return
+        self.prefetched.pop(key, None)
+        self.prefetched[key] = self.start(fn, *args, **kwargs)
+        while len(self.prefetched) > self.prefetch_size:
+            _, dropped = self.prefetched.popitem(last=False)
+            dropped.cancel()
+
+    def cancel(self):
+        if self.future is not None:
+            self.future.cancel()
+        self.future = None
+        self.context = None
+
+    def poll(self) -> Optional[tuple]:
+        """
+        (result, context) once the current load is done, otherwise None
+        If the load raised an exception, it's raised here instead
+        """
+        if self.future is None or not self.future.done():
+            return None
+        future, context = self.future, self.context
+        self.future = None
+        self.context = None
+        return future.result(), context
+
+    def shutdown(self):
+        self.cancel()
+        for future in self.prefetched.values():
+            future.cancel()
+        self.prefetched.clear()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
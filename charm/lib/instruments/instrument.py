@@ -19,6 +19,7 @@ class Instrument:
     def __init__(self, joydev):
         self._joydev = joydev  # Required to prevent pygame from deleting the joystick
         self._events: List[InstrumentEvent] = []
+        self.recorder = None  # a ReplayRecorder, see charm.lib.instruments.replay
 
     @classmethod
     def connect(cls, joynum: int):
@@ -36,6 +37,8 @@ class Instrument:
 
     def add_event(self, event: InstrumentEvent):
         self._events.append(event)
+        if self.recorder is not None:
+            self.recorder.record(event)
 
     def get_events(self) -> List[InstrumentEvent]:
         events = self._events.copy()
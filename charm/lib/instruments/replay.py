@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+from math import floor
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+
+from charm.lib.instruments.guitar import FretEvent, JoyEvent, StarEvent, StartEvent, StrumEvent, WhammyEvent, WhammyMotion
+from charm.lib.instruments.instrument import Instrument, InstrumentEvent
+
+# Replay file layout:
+#   MAGIC, VERSION byte, then one record per event:
+#   varint   zigzagged change in tracktime since the last event, in TIME_RESOLUTION steps (negative when rewinding)
+#   byte     event code: type index (bits 0-2) | ON state (bit 3) | fret number or joy direction (bits 4-7)
+#   byte     shape bitmask, green = bit 0 (fret and strum events only)
+#   uint16   whammy position * 65535, little endian (whammy motion only)
+MAGIC = b"CHRP"
+VERSION = 1
+TIME_RESOLUTION = 1_000_000  # microseconds
+EVENT_TYPES = [FretEvent, StrumEvent, StarEvent, StartEvent, WhammyEvent, JoyEvent, WhammyMotion]
+JOY_DIRECTIONS = ["UP", "DOWN", "LEFT", "RIGHT"]
+# Frets are numbered 1-5 by the Wiitar (0-4 in some tests), and the code byte only has 4 bits for them anyway
+MAX_FRETNUM = 5
+# Time changes are at most this many varint bytes, about 4.7 hours either way, so a corrupt replay can't claim years
+MAX_VARINT_BYTES = 5
+
+
+class ReplayException(Exception):
+    pass
+
+
+class BadReplayException(ReplayException):
+    pass
+
+
+def shape_to_mask(shape: Iterable[bool]) -> int:
+    mask = 0
+    for fret, pressed in enumerate(shape):
+        if pressed:
+            mask |= 1 << fret
+    return mask
+
+
+def mask_to_shape(mask: int) -> Tuple[bool]:
+    return tuple(bool(mask & (1 << fret)) for fret in range(5))
+
+
+class ReplayRecorder:
+    """
+    Records every event an Instrument adds into a compact binary replay (see the layout above)
+    Recording only appends a few bytes to a buffer, nothing touches the disk until save()
+    """
+    def __init__(self) -> None:
+        self.buffer = bytearray(MAGIC)
+        self.buffer.append(VERSION)
+        self.last_time = 0
+        self.count = 0
+
+    def attach(self, instrument: Instrument):
+        instrument.recorder = self
+
+    def detach(self, instrument: Instrument):
+        if instrument.recorder is self:
+            instrument.recorder = None
+
+    def record(self, event: InstrumentEvent):
+        """
+        Append one event, raising ReplayException (and recording nothing) if it can't be stored
+        """
+        try:
+            eventtype = EVENT_TYPES.index(type(event))
+        except ValueError:
+            raise ReplayException(f"Can't record {type(event).__name__} events")
+
+        record = bytearray()
+        # Floor, so a replayed event is never later than the original (and never misses its frame)
+        time = floor(event.tracktime * TIME_RESOLUTION)
+        delta = time - self.last_time
+        zigzag = delta * 2 if delta >= 0 else -delta * 2 - 1
+        if zigzag >= 1 << (7 * MAX_VARINT_BYTES):
+            raise ReplayException(f"Can't record a jump of {delta / TIME_RESOLUTION} seconds between events")
+        while zigzag >= 0x80:
+            record.append((zigzag & 0x7F) | 0x80)
+            zigzag >>= 7
+        record.append(zigzag)
+
+        code = eventtype | event.name.endswith("_ON") << 3
+        if isinstance(event, FretEvent):
+            if not 0 <= event.fretnum <= MAX_FRETNUM:
+                raise ReplayException(f"Can't record fret {event.fretnum}")
+            code |= event.fretnum << 4
+        elif isinstance(event, JoyEvent):
+            if event.direction not in JOY_DIRECTIONS:
+                raise ReplayException(f"Can't record joystick direction {event.direction!r}")
+            code |= JOY_DIRECTIONS.index(event.direction) << 4
+        record.append(code)
+        if isinstance(event, (FretEvent, StrumEvent)):
+            record.append(shape_to_mask(event.shape))
+        elif isinstance(event, WhammyMotion):
+            record.extend(round(min(max(event.position, 0), 1) * 0xFFFF).to_bytes(2, "little"))
+
+        self.buffer.extend(record)
+        self.last_time = time
+        self.count += 1
+
+    def write(self, f: BinaryIO):
+        f.write(self.buffer)
+
+    def save(self, path: Union[Path, str]):
+        with open(path, "wb") as f:
+            self.write(f)
+
+
+def read_replay(data: bytes) -> Iterator[InstrumentEvent]:
+    """
+    Rebuild the InstrumentEvents recorded in a replay, in recorded order
+    Raises BadReplayException as soon as anything in it doesn't fit the layout
+    """
+    if len(data) <= len(MAGIC) or data[:len(MAGIC)] != MAGIC:
+        raise BadReplayException("Not a replay file")
+    if data[len(MAGIC)] != VERSION:
+        raise BadReplayException(f"Unsupported replay version {data[len(MAGIC)]}")
+    pos = len(MAGIC) + 1
+    time = 0
+    try:
+        while pos < len(data):
+            zigzag = shift = 0
+            while True:
+                byte = data[pos]
+                pos += 1
+                zigzag |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+                if shift >= 7 * MAX_VARINT_BYTES:
+                    raise BadReplayException(f"Time change at byte {pos} is too long")
+            time += zigzag >> 1 if not zigzag & 1 else -(zigzag >> 1) - 1
+            tracktime = time / TIME_RESOLUTION
+
+            code = data[pos]
+            pos += 1
+            if code & 0b111 >= len(EVENT_TYPES):
+                raise BadReplayException(f"Unknown event type {code & 0b111} at byte {pos - 1}")
+            eventtype = EVENT_TYPES[code & 0b111]
+            state = bool(code & 0b1000)
+            extra = code >> 4
+            max_extra = {FretEvent: MAX_FRETNUM, JoyEvent: len(JOY_DIRECTIONS) - 1}.get(eventtype, 0)
+            if extra > max_extra or (eventtype is WhammyMotion and state):
+                raise BadReplayException(f"Bad {eventtype.__name__} code {code:#04x} at byte {pos - 1}")
+            if eventtype in (FretEvent, StrumEvent) and data[pos] >= 1 << 5:
+                raise BadReplayException(f"Bad fret mask {data[pos]:#04x} at byte {pos}")
+            if eventtype is FretEvent:
+                yield FretEvent(tracktime, state, extra, mask_to_shape(data[pos]))
+                pos += 1
+            elif eventtype is StrumEvent:
+                yield StrumEvent(tracktime, state, mask_to_shape(data[pos]))
+                pos += 1
+            elif eventtype is JoyEvent:
+                yield JoyEvent(tracktime, state, JOY_DIRECTIONS[extra])
+            elif eventtype is WhammyMotion:
+                if pos + 2 > len(data):
+                    raise IndexError
+                yield WhammyMotion(tracktime, int.from_bytes(data[pos:pos + 2], "little") / 0xFFFF)
+                pos += 2
+            else:
+                yield eventtype(tracktime, state)
+    except IndexError:
+        raise BadReplayException(f"Replay is truncated or corrupt at byte {pos}")
+
+
+def load_replay(path: Union[Path, str]) -> List[InstrumentEvent]:
+    return list(read_replay(Path(path).read_bytes()))
+
+
+class ReplayInstrument(Instrument):
+    """
+    An Instrument that plays back recorded events instead of reading a device, e.g. to drive a live HitManager
+    Call update(tracktime) every frame, then read the new events with get_events() like any other instrument
+    """
+    def __init__(self, events: Iterable[InstrumentEvent]):
+        super().__init__(None)
+        self._replay = iter(events)
+        self._pending: Optional[InstrumentEvent] = next(self._replay, None)
+
+    @property
+    def finished(self) -> bool:
+        return self._pending is None
+
+    def update(self, tracktime, events=None):
+        while self._pending is not None and self._pending.tracktime <= tracktime:
+            self.add_event(self._pending)
+            self._pending = next(self._replay, None)
@@ -1,4 +1,6 @@
-from typing import Iterable, Tuple, Union
+import sys
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple, Union
 
 import cv2
 import numpy as np
@@ -6,6 +8,7 @@ from numpy import ndarray
 
 import pygame
 from pygame import Color, Vector2
+from pygame.constants import SRCALPHA
 from pygame.surface import Surface
 
 
@@ -100,14 +103,99 @@ def getTF(src: Quad, dst: Quad) -> TFMatrix:
     return pm
 
 
-def warp_surface(surf: Surface, src: Quad, dst: Quad) -> Surface:
-    surfarray = pygame.surfarray.array3d(surf).swapaxes(0, 1)
-    alphaarray = pygame.surfarray.array_alpha(surf).swapaxes(0, 1)
-    merged = np.dstack((surfarray, alphaarray))
-    w, h = surf.get_size()
-    pm = getTF(src, dst)
-    img_output: ndarray = cv2.warpPerspective(merged, pm, (w, h))
-    flat = img_output.flatten()
-    surfout = pygame.image.frombuffer(flat, (w, h), "RGBA")
-
-    return surfout
+def warp_surface(surf: Surface, src: Quad, dst: Quad, out: Optional[Surface] = None) -> Surface:
+    """
+    Warp `src` Quad coords on surf onto `dst` Quad coords
+    Pass the surface returned last time as `out` to draw into it instead of making a new one
+    """
+    if surf.get_bitsize() != 32:
+        converted = Surface(surf.get_size(), SRCALPHA, 32)
+        converted.blit(surf, (0, 0))
+        surf = converted
+    if out is None or out.get_size() != surf.get_size() or out.get_masks() != surf.get_masks():
+        out = Surface(surf.get_size(), SRCALPHA, surf)
+    pixels, output = rgba_view(surf), rgba_view(out)
+    cv2.warpPerspective(pixels, getTF(src, dst), surf.get_size(), dst=output)
+    del pixels, output
+    return out
+
+
+@lru_cache(maxsize=8)
+def remap_grid(size: Tuple[int, int], src: Tuple, dst: Tuple) -> Tuple[ndarray, ndarray]:
+    """
+    The cv2.remap maps for warping `src` Quad coords onto `dst` Quad coords on a surface of `size`
+    i.e. for every output pixel, where in the input it comes from, in cv2's fixed-point format
+    """
+    w, h = size
+    # warpPerspective does the same thing, walking the output back through the inverse transform
+    inverse = np.linalg.inv(getTF(Quad(*src), Quad(*dst)))
+    xs, ys = np.meshgrid(np.arange(w, dtype=np.float64), np.arange(h, dtype=np.float64))
+    points = np.stack((xs, ys, np.ones_like(xs)), axis=-1) @ inverse.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        map_x = (points[..., 0] / points[..., 2]).astype(np.float32)
+        map_y = (points[..., 1] / points[..., 2]).astype(np.float32)
+    return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+
+def rgba_view(surf: Surface) -> ndarray:
+    """
+    A (height, width, 4) view of a 32-bit surface's pixels, in whatever channel order the surface uses
+    The surface stays locked until the view is gone, so don't hold on to it past the next blit
+    """
+    return np.asarray(surf.get_view("2")).T.view(np.uint8).reshape(surf.get_height(), surf.get_width(), 4)
+
+
+def channel_order(surf: Surface) -> str:
+    """
+    The order the channels of a 32-bit surface come in rgba_view, e.g. "BGRA"
+    Channels the surface doesn't have (usually alpha) are "x"
+    """
+    order = ["x"] * 4
+    for name, mask, shift in zip("RGBA", surf.get_masks(), surf.get_shifts()):
+        if mask:
+            order[shift // 8 if sys.byteorder == "little" else 3 - shift // 8] = name
+    return "".join(order)
+
+
+BGR_CONVERSIONS = {
+    "BGRA": cv2.COLOR_BGR2BGRA,
+    "BGRx": cv2.COLOR_BGR2BGRA,
+    "RGBA": cv2.COLOR_BGR2RGBA,
+    "RGBx": cv2.COLOR_BGR2RGBA
+}
+
+
+def write_bgr(frame: ndarray, surf: Surface):
+    """
+    Copy a (height, width, 3) BGR image, like a cv2 video frame, straight into surf's pixels
+    Any alpha channel ends up opaque
+    """
+    if surf.get_bitsize() != 32 or channel_order(surf) not in BGR_CONVERSIONS:
+        raise ValueError(f"Can't write BGR into a {surf.get_bitsize()}-bit {channel_order(surf)} surface")
+    if frame.shape[:2] != (surf.get_height(), surf.get_width()):
+        raise ValueError(f"A {frame.shape[1]}x{frame.shape[0]} frame doesn't fit a {surf.get_width()}x{surf.get_height()} surface")
+    pixels = rgba_view(surf)
+    cv2.cvtColor(frame, BGR_CONVERSIONS[channel_order(surf)], dst=pixels)
+    del pixels
+
+
+class Warper:
+    """
+    warp_surface for one size and pair of quads, with the remap grid worked out once
+    Warps straight from the source surface's pixels into an output surface that gets reused every call
+    """
+    def __init__(self, size: Tuple[int, int], src: Quad, dst: Quad):
+        self.size = tuple(size)
+        self.map1, self.map2 = remap_grid(self.size, src.coords, dst.coords)
+        self.output: Optional[Surface] = None
+
+    def warp(self, surf: Surface) -> Surface:
+        if surf.get_size() != self.size or surf.get_bitsize() != 32:
+            raise ValueError(f"Warper is for 32-bit {self.size} surfaces, not {surf.get_bitsize()}-bit {surf.get_size()}")
+        # Same pixel format as the source, so the channels can be remapped without knowing their order
+        if self.output is None or self.output.get_masks() != surf.get_masks():
+            self.output = Surface(self.size, SRCALPHA, surf)
+        src, dst = rgba_view(surf), rgba_view(self.output)
+        cv2.remap(src, self.map1, self.map2, cv2.INTER_LINEAR, dst=dst, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        del src, dst
+        return self.output
@@ -1,14 +1,13 @@
-from typing import List
-
-from nindex import Index
+from bisect import bisect_left, bisect_right
+from typing import Iterator, List, Optional, Sequence
 
 
 class Tape:
-    def __init__(self, items: List, tapeattr: str) -> None:
+    def __init__(self, items: List, tapeattr: str, keys: Optional[Sequence[float]] = None) -> None:
         self.items = items
         self.tapeattr = tapeattr
-
-        self._index = Index(items, self.tapeattr)
+        # The sorted tapeattr of every item, for bisecting
+        self.keys = [getattr(item, tapeattr) for item in items] if keys is None else keys
 
         self.current_index = 0
         self.current_position = 0
@@ -16,18 +15,19 @@ class Tape:
     def get_items(self, position: float):
         if position < self.current_position:
             self.jump_to(position)
-        new_items = []
         self.current_position = position
-        try:
-            while getattr(self.items[self.current_index], self.tapeattr) <= position:
-                new_items.append(self.items[self.current_index])
-                self.current_index += 1
-        except IndexError:
-            pass
-        return new_items
+        items, attr = self.items, self.tapeattr
+        start = stop = self.current_index
+        end = len(items)
+        while stop < end and getattr(items[stop], attr) <= position:
+            stop += 1
+        if stop == start:
+            return []
+        self.current_index = stop
+        return items[start:stop]
 
     def jump_to(self, position: float):
-        self.current_index = self._index.lteq_index(position) if self._index.lteq_index(position) is not None else 0
+        self.current_index = max(bisect_right(self.keys, position) - 1, 0)
 
 
 class BufferedTape:
@@ -46,11 +46,85 @@ class BufferedTape:
         if position < self.current_position:
             self.jump_to(position - self.scanner_width)
         self.current_position = position
-        self.current_items.extend(self.tape.get_items(position + self.scanner_width))
-        while self.current_items and self.current_position - self.scanner_width > getattr(self.current_items[0], "start"):
-            self.current_items.pop(0)
+        current = self.current_items
+        new_items = self.tape.get_items(position + self.scanner_width)
+        if new_items:
+            current.extend(new_items)
+        # Most updates don't expire anything, so skip the call when the oldest item is still in the window
+        if current and position - self.scanner_width > getattr(current[0], self.tapeattr):
+            self.trim(position)
+
+    def trim(self, position: float) -> List:
+        """
+        Drop the items that have scrolled out the back of the window and return them
+        They're cut off in one slice, instead of popping the front of the list one by one
+        """
+        current, attr = self.current_items, self.tapeattr
+        cutoff = position - self.scanner_width
+        if not current or cutoff <= getattr(current[0], attr):
+            return []
+        expired = 1
+        while expired < len(current) and cutoff > getattr(current[expired], attr):
+            expired += 1
+        items = current[:expired]
+        del current[:expired]
+        return items
 
     def jump_to(self, position: float):
         self.current_position = position
         self.current_items = []
         self.tape.jump_to(position)
+
+
+class WindowedTape:
+    """
+    A BufferedTape whose window is just a pair of indices into the sorted items, [start, stop)
+    Seeking either way is a bisect of the item keys, and nothing is copied unless you ask for current_items
+    """
+    def __init__(self, items: Sequence, tapeattr: str, scanner_width: float, keys: Optional[Sequence[float]] = None) -> None:
+        self.items = items
+        self.tapeattr = tapeattr
+        self.scanner_width = scanner_width
+        # The sorted tapeattr of every item; pass these in if you already have them (e.g. a column's .tolist())
+        self.keys = [getattr(item, tapeattr) for item in items] if keys is None else keys
+
+        self.start = 0
+        self.stop = 0
+        self.current_position = 0
+        self.jump_to(self.current_position)
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __iter__(self) -> Iterator:
+        for index in range(self.start, self.stop):
+            yield self.items[index]
+
+    @property
+    def current_items(self) -> List:
+        return [self.items[index] for index in range(self.start, self.stop)]
+
+    def set_position(self, position: float):
+        if position < self.current_position:
+            self.jump_to(position)
+            return
+        self.current_position = position
+        self.stop = bisect_right(self.keys, position + self.scanner_width, self.stop)
+        start = bisect_left(self.keys, position - self.scanner_width, self.start, self.stop)
+        if start != self.start:
+            self.expire(self.start, start)
+            self.start = start
+
+    def expire(self, start: int, stop: int):
+        """
+        Called with the range of indexes that just scrolled out the back of the window
+        """
+        pass
+
+    def jump_to(self, position: float):
+        """
+        Move the window straight to position, without expiring anything on the way
+        """
+        self.current_position = position
+        self.stop = bisect_right(self.keys, position + self.scanner_width)
+        self.start = bisect_left(self.keys, position - self.scanner_width, 0, self.stop)
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+from functools import cache
+from pathlib import Path
+from typing import Iterable, Tuple, Union
+
+import nindex
+import numpy as np
+
+import charm.song
+from charm.loaders import chchart, raw_chchart
+from charm.song import Song
+
+# Bump this if the cache file layout changes without any loader code changing
+CACHE_VERSION = 1
+
+cache_path = Path(".chartcache")
+
+# Every module whose classes end up in a pickled Song (chchart for LazyCharts), or that decides what goes in one
+source_modules = (raw_chchart, chchart, charm.song)
+# Libraries whose classes get pickled too (nindex.Index, NumPy arrays), they're tracked by version instead of source
+library_modules = (nindex, np)
+
+
+@cache
+def loader_version() -> str:
+    """
+    Hash of the loader and song model source code, and the versions of the libraries a Song pickles
+    Any change to how a Song is built invalidates every cached Song
+    Modules only imported by these (e.g. charm.lib) aren't hashed, bump CACHE_VERSION if one of them changes a Song
+    """
+    h = hashlib.sha1(f"{CACHE_VERSION}".encode())
+    for module in source_modules:
+        h.update(Path(module.__file__).read_bytes())
+    for module in library_modules:
+        h.update(f"{module.__name__}={module.__version__}".encode())
+    return h.hexdigest()
+
+
+def cache_key(data: bytes) -> str:
+    return f"{hashlib.sha1(data).hexdigest()}-{loader_version()[:16]}"
+
+
+def read_cached(entry: Path) -> Union[Song, None]:
+    try:
+        with entry.open("rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError, IndexError):
+        # Half-written or corrupt entry, just rebuild it
+        return None
+    except (AttributeError, ImportError):
+        # Pickled before a class it uses was moved or renamed, just rebuild it
+        return None
+
+
+def write_cached(entry: Path, song: Song):
+    """
+    Write the entry under a unique temporary name, then swap it in
+    Background loaders can cache the same chart at once, each one replaces the entry with a whole file
+    """
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=entry.parent, prefix=entry.stem, suffix=".tmp", delete=False) as f:
+        try:
+            pickle.dump(song, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, entry)
+
+
+def load(path: Union[Path, str], *, cache_dir: Union[Path, str, None] = cache_path, lazy: bool = False, preload: Iterable[Tuple[str, str]] = ()) -> Song:
+    """
+    Load a finalized Song from a .chart file, using the compiled copy in cache_dir if this exact file has been loaded before
+    Pass cache_dir=None to skip the cache entirely
+    With lazy=True charts are only built when they're looked up (see chchart.load), except for the `preload` charts,
+    which are built before the song is cached
+    """
+    data = Path(path).read_bytes()
+    entry = None
+    if cache_dir is not None:
+        suffix = "-lazy" if lazy else ""
+        entry = Path(cache_dir) / f"{cache_key(data)}{suffix}.pickle"
+        if (song := read_cached(entry)) is not None:
+            return song
+
+    with io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig") as f:
+        song = chchart.load(f, lazy=lazy)
+    for key in preload:
+        song.charts.get(key)
+
+    if entry is not None:
+        write_cached(entry, song)
+    return song
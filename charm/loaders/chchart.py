@@ -1,13 +1,16 @@
 from __future__ import annotations
 
 import re
-from itertools import groupby, product
-from typing import Dict, List, Tuple, Union
+from collections.abc import Mapping
+from configparser import ConfigParser, Error as ConfigParserError
+from itertools import product
+from typing import Dict, Iterable, List, Tuple, Union
 
+import numpy as np
 from nygame.emoji import emojize
 
-from charm.loaders.raw_chchart import RawEvent, RawLyric, RawNote, RawPhraseEnd, RawPhraseStart, RawSection, RawStarPower, RawTempo, RawAnchor, RawTS, RawMetadata, load_raw
-from charm.song import Chart, Chord, Event, LyricPhrase, LyricWord, Note, Section, Song, SPEvent, TSEvent, TempoCalculator, TempoEvent
+from charm.loaders.raw_chchart import RawEvent, RawLyric, RawNote, RawPhraseEnd, RawPhraseStart, RawSection, RawStarPower, RawTempo, RawAnchor, RawTS, RawMetadata, load_raw, mmap_lines, parse_lines, stream_raw
+from charm.song import FLAG_CODES, Chart, ChordColumns, Event, LyricPhrase, LyricWord, NoteColumns, Section, Song, SPEvent, TSEvent, TempoCalculator, TempoEvent
 
 
 class LoadException(Exception):
@@ -68,11 +71,6 @@ class UnparsedMetadataException(LoadException):
         self.keys = keys
 
 
-def note_from_raw(song: Song, chart: Chart, rawnote: RawNote) -> Note:
-    note = Note(song, chart, rawnote.tick_start, rawnote.fret, rawnote.tick_length)
-    return note
-
-
 def spevent_from_raw(song: Song, chart: Chart, rawspevent: RawStarPower) -> SPEvent:
     spevent = SPEvent(song, chart, rawspevent.tick_start, rawspevent.kind, rawspevent.tick_length)
     return spevent
@@ -101,7 +99,7 @@ def chart_from_raw(song: Song, header: str, lines: List[RawNote, RawEvent, RawTe
     events = []
     for line in lines:
         if isinstance(line, RawNote):
-            notes.append(note_from_raw(song, chart, line))
+            notes.append((line.tick_start, line.fret, line.tick_length))
         elif isinstance(line, RawStarPower):
             star_powers.append(spevent_from_raw(song, chart, line))
         elif isinstance(line, RawEvent):
@@ -109,25 +107,35 @@ def chart_from_raw(song: Song, header: str, lines: List[RawNote, RawEvent, RawTe
         else:
             raise InvalidLineTypeException(f"Bad line type {line}")
 
-    chart.notes = notes
+    chart.note_columns = NoteColumns.from_rows(notes)
+    chart.chord_columns = notes_to_chords(chart.note_columns)
     chart.star_powers = star_powers
     chart.events = events
-    chart.chords = [notes_to_chord(song, chart, list(notes)) for _, notes in groupby(chart.notes, key=lambda n: n.tick_start)]
     chart.finalize()
     return chart
 
 
-def notes_to_chord(song, chart, notes):
-    frets = [n.fret for n in notes]
-    if 6 in frets:
-        flag = "tap"
-    elif 5 in frets:
-        flag = "forced"
-    else:
-        flag = "note"
-    notes = [n for n in notes if n.fret not in (5, 6)]
-    chord = Chord(song, chart, flag, notes)
-    return chord
+def notes_to_chords(notes: NoteColumns) -> ChordColumns:
+    if len(notes) == 0:
+        return ChordColumns.empty()
+    frets = notes.fret
+    tap = frets == 6
+    forced = frets == 5
+    playable = ~(tap | forced)
+
+    # Every note on the same tick belongs to the same chord
+    note_start = np.flatnonzero(np.diff(notes.tick_start, prepend=notes.tick_start[0] - 1))
+    note_stop = np.append(note_start[1:], len(notes))
+
+    fret_bits = np.where(playable & (frets < 64), np.uint64(1) << frets.clip(0, 63).astype(np.uint64), np.uint64(0))
+    fret_mask = np.bitwise_or.reduceat(fret_bits, note_start)
+    tick_length = np.maximum.reduceat(np.where(playable, notes.tick_length, -1), note_start)
+    flag = np.where(np.logical_or.reduceat(tap, note_start), FLAG_CODES["tap"],
+                    np.where(np.logical_or.reduceat(forced, note_start), FLAG_CODES["forced"], FLAG_CODES["note"])).astype(np.uint8)
+
+    # A tick with only forced/tap markers on it isn't a chord
+    has_notes = np.logical_or.reduceat(playable, note_start)
+    return ChordColumns(notes.tick_start[note_start][has_notes], tick_length[has_notes], fret_mask[has_notes], flag[has_notes], note_start[has_notes], note_stop[has_notes])
 
 
 def tryint(value):
@@ -137,6 +145,18 @@ def tryint(value):
         return value
 
 
+RE_PARENTHETICAL = re.compile(r"(.*)(\(.*\).*)")
+
+
+def split_title(full_name: str) -> Tuple[str, str]:
+    """
+    Split "Title (Subtitle)" into its title and subtitle
+    """
+    if full_name is not None and (m := RE_PARENTHETICAL.match(full_name)):
+        return m.groups()
+    return full_name, None
+
+
 # TODO: Handle metadata smarter
 def set_metadata(song, lines: List[RawMetadata]) -> Dict[str, Union[str, int]]:
     metadata = {}
@@ -146,11 +166,7 @@ def set_metadata(song, lines: List[RawMetadata]) -> Dict[str, Union[str, int]]:
         metadata[md.key] = md.value
     # TODO: Which metadata fields are required, and which are optional?
     song.full_name = metadata.pop("Name", None)
-    song.title, song.subtitle = song.full_name, None
-    if song.full_name is not None:
-        RE_PARENTHETICAL = re.compile(r"(.*)(\(.*\).*)")
-        if m := RE_PARENTHETICAL.match(song.full_name):
-            song.title, song.subtitle = m.groups()
+    song.title, song.subtitle = split_title(song.full_name)
 
     song.alt_title = "UNUSED"
     song.artists = metadata.pop("Artist", None)
@@ -172,6 +188,43 @@ def set_metadata(song, lines: List[RawMetadata]) -> Dict[str, Union[str, int]]:
         raise UnparsedMetadataException(list(metadata.keys()))
 
 
+# song.ini keys for the Song attributes a chart's [Song] block can leave out, in order of preference
+INI_FIELDS = {
+    "full_name": ("name",),
+    "artists": ("artist",),
+    "album": ("album",),
+    "year": ("year",),
+    "charter": ("charter", "frets"),
+    "genre": ("genre",)
+}
+
+
+def read_song_ini(path) -> Dict[str, str]:
+    """
+    The [song] section of a song.ini, or {} if it's missing or unreadable
+    """
+    parser = ConfigParser(strict=False, interpolation=None)
+    try:
+        with open(path, encoding="utf-8-sig", errors="replace") as f:
+            parser.read_file(f)
+    except (OSError, ConfigParserError):
+        return {}
+    for section in parser.sections():
+        if section.lower() == "song":
+            return dict(parser[section])
+    return {}
+
+
+def fill_from_ini(song: Song, ini: Dict[str, str]):
+    for attr, keys in INI_FIELDS.items():
+        if getattr(song, attr) is not None:
+            continue
+        value = next((ini[key] for key in keys if ini.get(key)), None)
+        setattr(song, attr, value)
+    if song.title is None:
+        song.title, song.subtitle = split_title(song.full_name)
+
+
 def parse_synctrack(song, lines: List[RawTempo, RawTS]) -> Tuple[TempoCalculator, List[TSEvent]]:
     raw_tempos: List[RawTempo] = []
     raw_timesigs: List[RawTS] = []
@@ -287,7 +340,37 @@ def clean_word(word: str):
     return word
 
 
-def song_from_raw(datablocks: Dict[str, List[RawNote, RawEvent, RawTempo, RawAnchor, RawTS, RawStarPower, RawMetadata]]) -> Song:
+class LazyCharts(Mapping):
+    """
+    A song's {(difficulty, instrument): Chart} mapping, where each chart is kept as the unparsed text of its .chart block
+    until the first time it's looked up
+    """
+    def __init__(self, song: Song, blocks: Dict[str, str], loaded: Dict[Tuple[str, str], Chart] = None):
+        self.song = song
+        self.blocks = {DIFFINST_MAP[header]: (header, text) for header, text in blocks.items()}
+        self.loaded: Dict[Tuple[str, str], Chart] = loaded or {}
+
+    def __getitem__(self, key: Tuple[str, str]) -> Chart:
+        if key not in self.loaded:
+            header, text = self.blocks[key]
+            chart = chart_from_raw(self.song, header, parse_lines(text.splitlines(keepends=True)))
+            self.song.finalize_chart(chart)
+            self.loaded[key] = chart
+            del self.blocks[key]
+        return self.loaded[key]
+
+    def __iter__(self):
+        yield from self.loaded
+        yield from self.blocks
+
+    def __len__(self):
+        return len(self.loaded) + len(self.blocks)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}(loaded = {list(self.loaded)}, unloaded = {list(self.blocks)})>"
+
+
+def song_from_raw(datablocks: Dict[str, List[RawNote, RawEvent, RawTempo, RawAnchor, RawTS, RawStarPower, RawMetadata]], *, lazy: bool = False) -> Song:
     if "Song" not in datablocks:
         raise MissingSongBlockException("Missing Song block")
     if "Events" not in datablocks:
@@ -301,8 +384,13 @@ def song_from_raw(datablocks: Dict[str, List[RawNote, RawEvent, RawTempo, RawAnc
     song.events, song.lyrics, song.sections = parse_events(song, datablocks.pop("Events"))
     part_vocals = datablocks.pop("PART VOCALS", None)    # TODO Handle vocals section
 
+    # Blocks that load_raw() left as strings are only parsed once they're looked up
+    unparsed = {block: text for block, text in datablocks.items() if lazy and block in DIFFINST_MAP}
+
     charts = {}
     for block, lines in datablocks.items():
+        if block in unparsed:
+            continue
         chart = chart_from_raw(song, block, lines)
         key = (chart.difficulty, chart.instrument)
         if key in charts:
@@ -312,10 +400,89 @@ def song_from_raw(datablocks: Dict[str, List[RawNote, RawEvent, RawTempo, RawAnc
 
     song.finalize()
 
+    if unparsed:
+        song.charts = LazyCharts(song, unparsed, charts)
+
+    return song
+
+
+def song_from_stream(blocks: Iterable[Tuple[str, Iterable[Union[RawNote, RawEvent, RawTempo, RawAnchor, RawTS, RawStarPower, RawMetadata]]]]) -> Song:
+    """
+    Like song_from_raw(), but builds the song block by block from (header, lines) pairs as they come out of stream_raw(),
+    so the raw lines of a block can be thrown away as soon as it's been turned into song objects
+    """
+    song = Song()
+    seen = set()
+    synctrack = None
+    charts = {}
+    for header, lines in blocks:
+        seen.add(header)
+        if header == "Song":
+            set_metadata(song, lines)
+            if synctrack is not None:
+                song.tempo_calc, song.timesigs = parse_synctrack(song, synctrack)
+        elif header == "SyncTrack":
+            # Tempos need the resolution from the Song block, so hold on to them if it hasn't shown up yet
+            if "Song" in seen:
+                song.tempo_calc, song.timesigs = parse_synctrack(song, lines)
+            else:
+                synctrack = list(lines)
+        elif header == "Events":
+            song.events, song.lyrics, song.sections = parse_events(song, lines)
+        elif header == "PART VOCALS":
+            pass    # TODO Handle vocals section
+        else:
+            chart = chart_from_raw(song, header, lines)
+            key = (chart.difficulty, chart.instrument)
+            if key in charts:
+                raise DuplicateChartException(f"Duplicate chart: {chart.difficulty} {chart.instrument}")
+            charts[key] = chart
+
+    if "Song" not in seen:
+        raise MissingSongBlockException("Missing Song block")
+    if "Events" not in seen:
+        raise MissingEventsBlockException("Missing Events block")
+    if "SyncTrack" not in seen:
+        raise MissingSyncTrackBlockException("Missing SyncTrack block")
+    song.charts = charts
+
+    song.finalize()
+
     return song
 
 
-def load(f) -> Song:
-    datablocks = load_raw(f)
-    song = song_from_raw(datablocks)
+def load_metadata(f, *, ini_path=None) -> Song:
+    """
+    Load just the [Song] block's metadata into an otherwise empty Song, and stop reading as soon as that block is done
+    If ini_path is given (usually the song.ini next to the chart), it fills in anything the [Song] block leaves out
+    """
+    song = Song()
+    has_song_block = False
+    for header, lines in stream_raw(f):
+        if header == "Song":
+            set_metadata(song, lines)
+            has_song_block = True
+            break
+    if ini_path is not None:
+        fill_from_ini(song, read_song_ini(ini_path))
+    if not has_song_block and song.full_name is None:
+        raise MissingSongBlockException("Missing Song block")
+    return song
+
+
+def load_streaming(path) -> Song:
+    """
+    Load a .chart file through a memory map, one block at a time
+    Peak memory stays close to the finished Song, instead of the raw lines of the whole file plus the Song
+    """
+    return song_from_stream(stream_raw(mmap_lines(path)))
+
+
+def load(f, *, lazy: bool = False) -> Song:
+    """
+    With lazy=True, each chart is parsed the first time it's looked up in song.charts, so only the charts you play cost anything
+    Parse errors in a chart block don't show up until that chart is looked up
+    """
+    datablocks = load_raw(f, unparsed=DIFFINST_MAP if lazy else ())
+    song = song_from_raw(datablocks, lazy=lazy)
     return song
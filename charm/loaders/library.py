@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from charm.loaders.chchart import DIFFINST_MAP, split_title, tryint
+from charm.loaders.raw_chchart import RE_BLOCK_HEADER, RawMetadata
+from charm.song import FLAG_FRETS
+
+# Bump this whenever scan_chart() or the tables change, and the index is rebuilt from scratch
+LIBRARY_VERSION = 1
+
+library_path = Path(".songlibrary.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    full_name TEXT,
+    title TEXT,
+    subtitle TEXT,
+    artist TEXT,
+    album TEXT,
+    year TEXT,
+    charter TEXT,
+    genre TEXT,
+    resolution INTEGER,
+    musicstream TEXT
+);
+CREATE TABLE IF NOT EXISTS charts (
+    path TEXT NOT NULL REFERENCES songs(path) ON DELETE CASCADE,
+    difficulty TEXT NOT NULL,
+    instrument TEXT NOT NULL,
+    notes INTEGER NOT NULL,
+    PRIMARY KEY (path, difficulty, instrument)
+);
+"""
+
+FLAG_FRET_TOKENS = tuple(str(fret) for fret in FLAG_FRETS)
+
+
+def scan_chart(path: Path) -> Tuple[Dict[str, Union[str, int]], Dict[Tuple[str, str], int]]:
+    """
+    Quickly read what the song library needs out of a .chart file, without building a Song
+    Only the [Song] block is parsed, chart blocks just have their note lines counted
+    Returns (song fields, {(difficulty, instrument): note count})
+    """
+    metadata = {}
+    notes = {}
+    block = None
+    with open(path, encoding="utf-8-sig") as f:
+        for line in f:
+            if line[:1] == "[" and (m := RE_BLOCK_HEADER.match(line)):
+                block = m.group(1)
+                if block in DIFFINST_MAP:
+                    notes[DIFFINST_MAP[block]] = 0
+            elif block == "Song":
+                if md := RawMetadata.parse(line):
+                    metadata[md.key] = md.value
+            elif block in DIFFINST_MAP:
+                tokens = line.partition("=")[2].split()
+                if tokens[:1] == ["N"] and tokens[1:2] and tokens[1] not in FLAG_FRET_TOKENS:
+                    notes[DIFFINST_MAP[block]] += 1
+
+    full_name = metadata.get("Name")
+    title, subtitle = split_title(full_name)
+    song = {
+        "full_name": full_name,
+        "title": title,
+        "subtitle": subtitle,
+        "artist": metadata.get("Artist"),
+        "album": metadata.get("Album"),
+        "year": metadata.get("Year"),
+        "charter": metadata.get("Charter"),
+        "genre": metadata.get("Genre"),
+        "resolution": tryint(metadata.get("Resolution")),
+        "musicstream": metadata.get("MusicStream")
+    }
+    return song, notes
+
+
+class SongLibrary:
+    """
+    An SQLite index of every notes.chart under a folder, with each song's metadata and per-chart note counts
+    refresh() only rescans charts that are new or have changed since they were last indexed
+    """
+    def __init__(self, db_path: Union[Path, str] = library_path):
+        self.db = sqlite3.connect(db_path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != LIBRARY_VERSION:
+            with self.db:
+                self.db.execute("DROP TABLE IF EXISTS charts")
+                self.db.execute("DROP TABLE IF EXISTS songs")
+                self.db.execute(f"PRAGMA user_version = {LIBRARY_VERSION}")
+        self.db.executescript(SCHEMA)
+
+    def refresh(self, root: Union[Path, str]) -> List[sqlite3.Row]:
+        """
+        Bring the index up to date with the charts under root, and return their songs sorted by path
+        """
+        root = Path(root).resolve()
+        known = {row["path"]: row for row in self.db.execute("SELECT path, mtime, size FROM songs")}
+        found = []
+        with self.db:
+            for chart_path in root.rglob("notes.chart"):
+                key = str(chart_path)
+                stat = chart_path.stat()
+                row = known.get(key)
+                if row is None or (row["mtime"], row["size"]) != (stat.st_mtime_ns, stat.st_size):
+                    try:
+                        song, notes = scan_chart(chart_path)
+                    except (OSError, UnicodeDecodeError):
+                        continue
+                    self.store(key, stat, song, notes)
+                found.append(key)
+            # Forget charts that were deleted from this folder
+            gone = [(key,) for key in known.keys() - set(found) if Path(key).is_relative_to(root)]
+            self.db.executemany("DELETE FROM songs WHERE path = ?", gone)
+        songs = {row["path"]: row for row in self.db.execute("SELECT * FROM songs")}
+        return [songs[key] for key in sorted(found)]
+
+    def store(self, key: str, stat, song: Dict[str, Union[str, int]], notes: Dict[Tuple[str, str], int]):
+        self.db.execute("DELETE FROM songs WHERE path = ?", (key,))
+        self.db.execute(
+            "INSERT INTO songs VALUES (:path, :mtime, :size, :full_name, :title, :subtitle, :artist, :album, :year, :charter, :genre, :resolution, :musicstream)",
+            song | {"path": key, "mtime": stat.st_mtime_ns, "size": stat.st_size}
+        )
+        self.db.executemany(
+            "INSERT INTO charts VALUES (?, ?, ?, ?)",
+            [(key, difficulty, instrument, count) for (difficulty, instrument), count in notes.items()]
+        )
+
+    def charts(self, path: Union[Path, str]) -> Dict[Tuple[str, str], int]:
+        """
+        {(difficulty, instrument): note count} for one indexed chart file
+        """
+        rows = self.db.execute("SELECT difficulty, instrument, notes FROM charts WHERE path = ?", (str(Path(path).resolve()),))
+        return {(row["difficulty"], row["instrument"]): row["notes"] for row in rows}
+
+    def close(self):
+        self.db.close()
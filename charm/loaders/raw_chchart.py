@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import mmap
+import os
 import re
 from dataclasses import dataclass
-from typing import Dict, List, Union
+from typing import Container, Dict, Iterable, Iterator, List, Tuple, Union
 
 RE_BLOCK_HEADER = re.compile(r"^\[([A-Za-z ]+)\]\s*$")
 RE_BLOCK_PADDING = re.compile(r"^[\{\}]$")
@@ -24,28 +26,110 @@ class LineParseException(RawLoadException):
     pass
 
 
-def load_raw(f) -> Dict[str, List[RawNote, RawEvent, RawTempo, RawAnchor, RawTS, RawStarPower, RawMetadata, RawSection]]:
+def load_raw(f, *, fast: bool = True, unparsed: Container[str] = ()) -> Dict[str, Union[List[RawNote, RawEvent, RawTempo, RawAnchor, RawTS, RawStarPower, RawMetadata, RawSection], str]]:
+    """
+    Blocks with a header in `unparsed` are kept as a single string of their lines, to be parsed later with parse_lines()
+    """
+    parse = parse_line_fast if fast else parse_line
     blocks = {}
+    skip_parse = False
     curr_block = None
     for line in f:
         # Hacky patch but I'm running into this a lot
         if line.startswith("\ufeff"):
             line = line.removeprefix("\ufeff")
-        if m := RE_BLOCK_PADDING.match(line):
+        # Padding and headers are the only lines that start with a bracket
+        bracketed = not fast or line[:1] in "{}["
+        if bracketed and RE_BLOCK_PADDING.match(line):
             continue
-        elif m := RE_BLOCK_HEADER.match(line):
+        elif bracketed and (m := RE_BLOCK_HEADER.match(line)):
             curr_block = m.group(1)
             if curr_block in blocks:
                 raise DuplicateBlockException(f"Duplicate block: {curr_block}")
             blocks[curr_block] = []
+            skip_parse = curr_block in unparsed
+        elif skip_parse:
+            blocks[curr_block].append(line)
         else:
-            lineobj = parse_line(line)
+            lineobj = parse(line)
             if lineobj is None:
                 raise LineParseException(f"Couldn't parse: {line}")
             blocks[curr_block].append(lineobj)
+    # One string per block is far smaller than one per line
+    for block, lines in blocks.items():
+        if block in unparsed:
+            blocks[block] = "".join(lines)
     return blocks
 
 
+def mmap_lines(path) -> Iterator[str]:
+    """
+    Lines of a .chart file read through a memory map, one at a time, without reading the whole file into memory
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b""):
+                line = line.decode("utf-8")
+                # Match the newlines a text mode file would give us
+                if line.endswith("\r\n"):
+                    line = line[:-2] + "\n"
+                yield line
+
+
+def stream_raw(f, *, fast: bool = True) -> Iterator[Tuple[str, Iterator[Union[RawNote, RawEvent, RawTempo, RawAnchor, RawTS, RawStarPower, RawMetadata, RawSection]]]]:
+    """
+    Streaming version of load_raw(), yielding (header, lines) for each block as it's reached
+    lines is a generator that parses the block one line at a time, and must be used before moving on to the next block
+    Whatever isn't read of a block is skipped
+    """
+    parse = parse_line_fast if fast else parse_line
+    lines = iter(f)
+    next_header = None
+
+    def block_lines():
+        nonlocal next_header
+        next_header = None
+        for line in lines:
+            if line.startswith("\ufeff"):
+                line = line.removeprefix("\ufeff")
+            bracketed = not fast or line[:1] in "{}["
+            if bracketed and RE_BLOCK_PADDING.match(line):
+                continue
+            elif bracketed and (m := RE_BLOCK_HEADER.match(line)):
+                next_header = m.group(1)
+                return
+            lineobj = parse(line)
+            if lineobj is None:
+                raise LineParseException(f"Couldn't parse: {line}")
+            yield lineobj
+
+    for lineobj in block_lines():
+        raise LineParseException(f"Line outside of a block: {lineobj}")
+    seen = set()
+    while next_header is not None:
+        header = next_header
+        if header in seen:
+            raise DuplicateBlockException(f"Duplicate block: {header}")
+        seen.add(header)
+        block = block_lines()
+        yield header, block
+        for _ in block:
+            pass
+
+
+def parse_lines(lines: Iterable[str], *, fast: bool = True) -> List[RawNote, RawEvent, RawTempo, RawAnchor, RawTS, RawStarPower, RawMetadata, RawSection]:
+    parse = parse_line_fast if fast else parse_line
+    lineobjs = []
+    for line in lines:
+        lineobj = parse(line)
+        if lineobj is None:
+            raise LineParseException(f"Couldn't parse: {line}")
+        lineobjs.append(lineobj)
+    return lineobjs
+
+
 def parse_line(line) -> Union[RawNote, RawLyric, RawPhraseStart, RawPhraseEnd, RawEvent, RawTempo, RawAnchor, RawTS, RawStarPower, RawMetadata, RawSection, None]:
     # parse RawMetadata last, because it's ambigious
     # parse RawLyric, RawPhraseStart and RawPhraseEnd before RawEvent, because they're subtypes of RawEvent
@@ -63,20 +147,13 @@ class RawLine:
     @classmethod
     def parse(cls, line):
         if m := cls.RE_LINE.match(line):
-            return cls(*m.groups())
+            values = (int(v) if v is not None and attrtype == "int" else v for v, attrtype in zip(m.groups(), cls.__annotations__.values()))
+            return cls(*values)
         return None
 
     def __str__(self):
         return f"<{repr(self)}>"
 
-    def __post_init__(self):
-        for attr, attrtype in self.__annotations__.items():
-            if attrtype == "int":
-                oldval = getattr(self, attr)
-                if oldval is None:
-                    return
-                setattr(self, attr, int(oldval))
-
 
 @dataclass
 class RawMetadata(RawLine):
@@ -161,3 +238,60 @@ class RawStarPower(RawTimedLine):
     tick_start: int
     kind: int
     tick_length: int
+
+
+# Fast path: look at the tokens around the "=" once and hand the line to the only class that could match it.
+# Every line produces the same Raw* object (or None) as parse_line().
+def parse_line_fast(line) -> Union[RawNote, RawLyric, RawPhraseStart, RawPhraseEnd, RawEvent, RawTempo, RawAnchor, RawTS, RawStarPower, RawMetadata, RawSection, None]:
+    key, sep, value = line.partition("=")
+    if not sep:
+        return None
+    key = key.strip()
+    # Only timed lines start with a tick number, and metadata keys can't start with a digit
+    if not key.isdecimal():
+        return RawMetadata.parse(line)
+    tokens = value.split()
+    if not tokens:
+        return None
+    linetype, args = tokens[0], tokens[1:]
+    if linetype == "E":
+        return parse_event_fast(line, value)
+    parser = FAST_PARSERS.get(linetype)
+    if parser is None or not "".join(args).isdecimal():
+        return None
+    return parser(int(key), *map(int, args))
+
+
+def parse_event_fast(line, value) -> Union[RawLyric, RawPhraseStart, RawPhraseEnd, RawSection, RawEvent, None]:
+    # Strip the "E" type token
+    data = value.lstrip()[1:].lstrip()
+    for prefix, rawclass in EVENT_PREFIXES:
+        if data.startswith(prefix):
+            if lineobj := rawclass.parse(line):
+                return lineobj
+            break
+    return RawEvent.parse(line)
+
+
+def fast_parser(rawclass, *argcounts):
+    def parser(tick_start, *args):
+        if len(args) not in argcounts:
+            return None
+        return rawclass(tick_start, *args)
+    return parser
+
+
+FAST_PARSERS = {
+    "N": fast_parser(RawNote, 2),
+    "S": fast_parser(RawStarPower, 2),
+    "B": fast_parser(RawTempo, 1),
+    "A": fast_parser(RawAnchor, 1),
+    "TS": fast_parser(RawTS, 1, 2)
+}
+
+EVENT_PREFIXES = [
+    ("\"lyric ", RawLyric),
+    ("\"phrase_start\"", RawPhraseStart),
+    ("\"phrase_end\"", RawPhraseEnd),
+    ("\"section ", RawSection)
+]
@@ -1,7 +1,7 @@
 
+import math
 import time
 from enum import Enum
-from itertools import cycle
 from pathlib import Path
 
 import nygame
@@ -14,12 +14,14 @@ from pygame.surface import Surface
 
 from charm.lib import instruments
 from charm.lib.args import InvalidArgException, tryint
+from charm.lib.bgloader import BackgroundLoader
 from charm.lib.dumbutils import beatbounce
+from charm.lib.instruments.replay import ReplayRecorder
 from charm.lib.nargs import nargs
 from charm.lib.pgutils import stacksurfs
 from charm.lib.utils import clamp, linear_one_to_zero, nice_time, truncate
-from charm.loaders import chchart
-from charm.prototyping import loader_demo
+from charm.loaders import chartcache, chchart
+from charm.prototyping import benchmark, loader_demo
 from charm.prototyping.hitdetection.scorecalculator import HitManager, ScoreCalculator
 from charm.prototyping.menu import menu2
 from charm.prototyping.notedisplay.hyperloop import HyperloopDisplay, init as hyperloop_init
@@ -28,6 +30,12 @@ from charm.prototyping.lyricanimator.lyricanimator import LyricAnimator
 from charm.prototyping.videoplayer.videoplayer import VideoPlayer
 
 
+# How many of the upcoming charts in Game.charts to load ahead of time
+PREFETCH_COUNT = 2
+# Every song played gets its inputs saved here, see charm.lib.instruments.replay
+replays_path = Path(".replays")
+
+
 def draw_pause():
     T.size = 42
     T.color = (0, 255, 255)
@@ -127,14 +135,15 @@ class Game(nygame.Game):
         pygame.display.set_icon(charm_icon)
 
         # Cycle of charts.
-        self.charts = cycle([
+        self.chart_index = -1
+        self.charts = [
             # Path("./charm/data/charts/chopsuey"),
             # Path("./charm/data/charts/notes"),
             Path("./charm/data/charts/run_around_the_character_code"),
             Path("./charm/data/charts/soulless5"),
             Path("./charm/data/charts/soflan"),
             Path("./charm/data/charts/hopotest")
-        ])
+        ]
 
         # Set up guitar.
         self.guitar = None
@@ -157,6 +166,8 @@ class Game(nygame.Game):
         self.songdata = SongDataDisplay(self)
         self.videoplayer = None
         self.highway = "./charm/data/images/highway.png"
+        self.recorder = None
+        self.replay_path = None
 
         # Static, generated images
         self.pause_image = draw_pause()
@@ -164,43 +175,79 @@ class Game(nygame.Game):
         self.logo = draw_logo()
 
         # Load default chart.
+        self.loader = BackgroundLoader(prefetch_size = PREFETCH_COUNT)
         self.load_chart()
 
         self.paused = False
         self.volume = 6
-        self.loading_timer = 0
-        self.loading_queued = None
         self.frame = 0
 
         hyperloop_init()
 
     def queue_chart(self, songfolder: str = None, filename = "notes.chart", difficulty = "Expert"):
-        self.loading_queued = {
-            "songfolder": songfolder,
-            "filename": filename,
-            "difficulty": difficulty
-        }
-        self.loading_timer = 1
-        # music.stop()
+        """
+        Load a chart in the background, while the current one keeps playing
+        Queueing another chart before this one is ready cancels this one
+        """
+        if songfolder is None:
+            songfolder = self.next_chart()
+        songpath = Path(songfolder) / filename
+        self.loader.submit(chartcache.load, songpath, lazy=True, preload=[(difficulty, 'Single')], context=(songfolder, difficulty), key=(songpath, difficulty))
+        # If it was prefetched and it's done, don't even wait a frame
+        self.poll_loader()
+
+    def next_chart(self) -> Path:
+        self.chart_index = (self.chart_index + 1) % len(self.charts)
+        return self.charts[self.chart_index]
+
+    def prefetch_charts(self, filename = "notes.chart", difficulty = "Expert"):
+        """
+        Start loading the next few charts in the cycle, so switching to them is instant
+        """
+        for i in range(1, PREFETCH_COUNT + 1):
+            songpath = self.charts[(self.chart_index + i) % len(self.charts)] / filename
+            self.loader.prefetch((songpath, difficulty), chartcache.load, songpath, lazy=True, preload=[(difficulty, 'Single')])
 
     def load_chart(self, songfolder: str = None, filename = "notes.chart", difficulty = "Expert"):
         if songfolder is None:
-            songfolder = next(self.charts)
+            songfolder = self.next_chart()
 
         songpath = Path(songfolder) / filename
 
-        with songpath.open("r", encoding="utf-8") as f:
-            self.song = chchart.load(f)
-
-        self.chart = self.song.charts[(difficulty, 'Single')]
-
-        self.lyricanimator = LyricAnimator(self.chart)   # TODO: Update to take Song object
-        self.hitmanager = HitManager(self.chart, self.guitar)
-        self.scorecalculator = ScoreCalculator(self.hitmanager)
-        self.hyperloop = HyperloopDisplay(self.chart, self.guitar, size=(400, 620), hitwindow_vis = False, bg = self.highway)
+        song = chartcache.load(songpath, lazy=True, preload=[(difficulty, 'Single')])
+        self.set_song(song, songfolder, difficulty)
+
+    def poll_loader(self):
+        """
+        Swap in the background load once it's done
+        If it failed, or the song it loaded can't be played, say why and keep playing the current song
+        """
+        context = self.loader.context
+        try:
+            loaded = self.loader.poll()
+            if loaded is not None:
+                song, (songfolder, difficulty) = loaded
+                self.set_song(song, songfolder, difficulty)
+        except Exception as e:
+            songfolder = context[0] if context is not None else "the next chart"
+            print(f"Couldn't load {songfolder}: {type(e).__name__}: {e}")
+
+    def set_song(self, song, songfolder, difficulty = "Expert"):
+        """
+        Swap in a loaded song and set up everything that plays it
+        Nothing is swapped until all of that has worked, so if this raises the current song is left as it was
+        """
+        songfolder = Path(songfolder)
+
+        chart = song.charts[(difficulty, 'Single')]
+
+        lyricanimator = LyricAnimator(chart)   # TODO: Update to take Song object
+        hitmanager = HitManager(chart, self.guitar)
+        scorecalculator = ScoreCalculator(hitmanager)
+        hyperloop = HyperloopDisplay(chart, self.guitar, size=(400, 620), hitwindow_vis = False, bg = self.highway)
         musicstream = None
 
-        possiblesongs = [self.song.musicstream, "song.ogg", "song.mp3", "guitar.ogg", "guitar.mp3"]
+        possiblesongs = [song.musicstream, "song.ogg", "song.mp3", "guitar.ogg", "guitar.mp3"]
         for possiblesong in possiblesongs:
             if musicstream is not None:
                 break
@@ -210,19 +257,48 @@ class Game(nygame.Game):
             if musicfile.exists():
                 musicstream = musicfile
 
+        if musicstream is None:
+            raise ValueError("No valid music file found!")
+
         videolist = list(songfolder.glob('*.mp4'))
         # videofile = songfolder / "video.mp4"
         if videolist:
             videofile = videolist[0]
-            self.videoplayer = VideoPlayer(str(videofile.absolute()), width = 400)
+            videoplayer = VideoPlayer(str(videofile.absolute()), width = 400)
         else:
-            self.videoplayer = None
-
-        if musicstream is None:
-            raise ValueError("No valid music file found!")
+            videoplayer = None
 
         music.play(musicstream)
 
+        self.song = song
+        self.chart = chart
+        self.lyricanimator = lyricanimator
+        self.hitmanager = hitmanager
+        self.scorecalculator = scorecalculator
+        self.hyperloop = hyperloop
+        self.videoplayer = videoplayer
+        self.start_recording(songfolder, difficulty)
+
+        self.prefetch_charts()
+
+    def start_recording(self, songfolder: Path, difficulty: str):
+        """
+        Save the last song's replay, and start recording the guitar for this one
+        """
+        self.save_replay()
+        self.recorder = ReplayRecorder()
+        self.recorder.attach(self.guitar)
+        self.replay_path = replays_path / f"{songfolder.name}-{difficulty}-{time.strftime('%Y%m%d-%H%M%S')}.chrp"
+
+    def save_replay(self):
+        if self.recorder is None:
+            return
+        self.recorder.detach(self.guitar)
+        if self.recorder.count:
+            self.replay_path.parent.mkdir(parents=True, exist_ok=True)
+            self.recorder.save(self.replay_path)
+        self.recorder = None
+
     def loop(self, events):
         now = None
 
@@ -256,10 +332,7 @@ class Game(nygame.Game):
                 elif event.key == K_EQUALS:
                     self.hyperloop.length += 0.05
                 elif event.key == K_RETURN:
-                    try:
-                        self.queue_chart()
-                    except chchart.UnparsedMetadataException as e:
-                        print(e)
+                    self.queue_chart()
                 self.hyperloop.length = max(0.05, self.hyperloop.length)
                 self.hyperloop.length = round(self.hyperloop.length, 2)
             elif event.type == MOUSEWHEEL:
@@ -299,14 +372,9 @@ class Game(nygame.Game):
         self.render_title(now)
         self.render_loading()
 
-        # Chart loading
-        # TODO: WOW this is jank and is ignoring the fact async exists good job duncan
-        if self.loading_queued:
-            if self.loading_timer > 0:
-                self.loading_timer -= 1
-            else:
-                self.load_chart(**self.loading_queued)
-                self.loading_queued = None
+        # Chart loading happens in the background, the new song is swapped in once it's ready
+        if self.loader.loading:
+            self.poll_loader()
 
     def render_lyrics(self):
         dest = self.lyricanimator.image.get_rect()
@@ -339,7 +407,9 @@ class Game(nygame.Game):
             self.surface.blit(self.pause_image, rect)
 
     def render_loading(self):
-        if self.loading_queued:
+        if self.loader.loading:
+            # Pulse, so it's obvious the game hasn't frozen
+            self.loading_image.set_alpha(int(160 + 95 * math.sin(self.frame / 12)))
             rect = self.loading_image.get_rect()
             rect.center = self.surface.get_rect().center
             self.surface.blit(self.loading_image, rect)
@@ -398,7 +468,11 @@ class Game(nygame.Game):
 
     def run(self):
         music.play()
-        super().run()
+        try:
+            super().run()
+        finally:
+            self.save_replay()
+            self.loader.shutdown()
 
 
 def list_charts():
@@ -424,6 +498,7 @@ class Mode(Enum):
     SingleTest = "single"
     ListCharts = "charts"
     MenuTest = "menu"
+    Benchmark = "bench"
 
 
 def play_chart(n=1):
@@ -465,6 +540,8 @@ def run(mode=Mode.Default.value, *args, **kwargs):
         print_charts()
     elif mode == Mode.MenuTest:
         menu2.Game(R"./charm/data/charts").run()
+    elif mode == Mode.Benchmark:
+        benchmark.main(*args, **kwargs)
     else:
         valid_modes = " / ".join(m.value for m in Mode)
         print(
@@ -0,0 +1,271 @@
+import io
+import random
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+
+from charm.lib.args import InvalidArgException, tryint
+from charm.lib.instruments.guitar import FretEvent, StrumEvent
+from charm.lib.instruments.instrument import Instrument
+from charm.lib.tape import BufferedTape, WindowedTape
+from charm.loaders import chchart, raw_chchart
+from charm.prototyping.hitdetection.scorecalculator import HitManager
+
+
+charts_root = Path("./charm/data/charts")
+
+
+def find_charts(path=None):
+    root = charts_root if path is None else Path(path)
+    if not root.exists():
+        raise InvalidArgException(f"Sorry, {root} doesn't exist")
+    if root.is_file():
+        return [root]
+    return sorted(root.rglob("*.chart"))
+
+
+def timeit(fn, repeat):
+    """
+    Run fn() `repeat` times and return the best time in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def bench_parser(charts, repeat):
+    print(f"Raw .chart parser (best of {repeat})")
+    print(f"{'chart':<48} {'lines':>8} {'regex l/s':>12} {'fast l/s':>12} {'speedup':>8}")
+    for chart in charts:
+        lines = chart.read_text(encoding="utf-8-sig").splitlines(keepends=True)
+        try:
+            slow = timeit(lambda: raw_chchart.load_raw(lines, fast=False), repeat)
+            fast = timeit(lambda: raw_chchart.load_raw(lines, fast=True), repeat)
+        except raw_chchart.RawLoadException as e:
+            print(f"{chart.parent.name:<48} {type(e).__name__}")
+            continue
+        print(f"{chart.parent.name:<48} {len(lines):>8} {len(lines) / slow:>12,.0f} {len(lines) / fast:>12,.0f} {slow / fast:>7.2f}x")
+
+
+def count_events(song):
+    events = len(song.tempo_calc.tempos) + len(song.timesigs) + len(song.events) + len(song.sections)
+    events += sum(1 + len(phrase.words) for phrase in song.lyrics)
+    for chart in song.charts.values():
+        events += len(chart.note_columns) + len(chart.chord_columns) + len(chart.star_powers) + len(chart.events)
+    return events
+
+
+def bench_memory(charts, repeat):
+    """
+    Memory retained by each loaded Song, after the loader's temporary objects are freed
+    """
+    print("Retained memory per loaded song")
+    print(f"{'chart':<48} {'events':>8} {'retained':>12} {'bytes/event':>12}")
+    total_events = total_size = 0
+    for chart in charts:
+        with chart.open(encoding="utf-8-sig") as f:
+            lines = f.readlines()
+        tracemalloc.start()
+        try:
+            song = chchart.load(lines)
+        except (raw_chchart.RawLoadException, chchart.LoadException) as e:
+            tracemalloc.stop()
+            print(f"{chart.parent.name:<48} {type(e).__name__}")
+            continue
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        events = count_events(song)
+        total_events += events
+        total_size += size
+        print(f"{chart.parent.name:<48} {events:>8} {size:>12,} {size / max(events, 1):>12,.1f}")
+        del song
+    print(f"{'total':<48} {total_events:>8} {total_size:>12,} {total_size / max(total_events, 1):>12,.1f}")
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def bench_stream(charts, repeat):
+    print(f"Whole-file vs streaming mmap loader (best of {repeat})")
+    print(f"{'chart':<48} {'load peak':>12} {'stream peak':>12} {'load ms':>9} {'stream ms':>9}")
+    for chart in charts:
+        def load():
+            with chart.open(encoding="utf-8-sig") as f:
+                chchart.load(f)
+
+        def load_streaming():
+            chchart.load_streaming(chart)
+
+        try:
+            peaks = peak_memory(load), peak_memory(load_streaming)
+            times = timeit(load, repeat), timeit(load_streaming, repeat)
+        except (raw_chchart.RawLoadException, chchart.LoadException) as e:
+            print(f"{chart.parent.name:<48} {type(e).__name__}")
+            continue
+        print(f"{chart.parent.name:<48} {peaks[0]:>12,} {peaks[1]:>12,} {times[0] * 1000:>9.1f} {times[1] * 1000:>9.1f}")
+
+
+def read_counted(chart, loader):
+    """
+    Run loader on an open text file of chart, returning how many bytes it actually pulled from disk
+    """
+    with open(chart, "rb", buffering=0) as raw:
+        with io.TextIOWrapper(io.BufferedReader(raw), encoding="utf-8-sig") as f:
+            loader(f)
+            return raw.tell()
+
+
+def bench_metadata(charts, repeat):
+    print(f"Full load vs metadata-only load (best of {repeat})")
+    print(f"{'chart':<48} {'size':>10} {'meta read':>10} {'load ms':>9} {'meta ms':>9}")
+    for chart in charts:
+        ini_path = chart.parent / "song.ini"
+
+        def load_metadata(f):
+            chchart.load_metadata(f, ini_path=ini_path)
+
+        try:
+            meta_read = read_counted(chart, load_metadata)
+            times = timeit(lambda: read_counted(chart, chchart.load), repeat), timeit(lambda: read_counted(chart, load_metadata), repeat)
+        except (raw_chchart.RawLoadException, chchart.LoadException) as e:
+            print(f"{chart.parent.name:<48} {type(e).__name__}")
+            continue
+        print(f"{chart.parent.name:<48} {chart.stat().st_size:>10,} {meta_read:>10,} {times[0] * 1000:>9.2f} {times[1] * 1000:>9.2f}")
+
+
+def sweep(tape, end, rate):
+    """
+    Play a tape from 0 to `end` seconds at `rate` updates per second
+    """
+    for frame in range(int(end * rate) + 1):
+        tape.set_position(frame / rate)
+
+
+def scrub(tape, end, steps=100):
+    """
+    Scrub a tape backwards from `end` to 0 in `steps` rewinds
+    """
+    for step in range(steps, -1, -1):
+        tape.set_position(end * step / steps)
+
+
+def bench_tape(charts, repeat, *, rate=120, width=0.07):
+    print(f"Buffered vs windowed chord tape at {rate} Hz, {width * 1000:.0f} ms window (best of {repeat})")
+    print(f"{'chart':<48} {'chords':>8} {'updates':>8} {'buf us/up':>10} {'win us/up':>10} {'buf scrub':>10} {'win scrub':>10}")
+    for chart in charts:
+        try:
+            with chart.open(encoding="utf-8-sig") as f:
+                song = chchart.load(f)
+        except (raw_chchart.RawLoadException, chchart.LoadException) as e:
+            print(f"{chart.parent.name:<48} {type(e).__name__}")
+            continue
+        if not song.charts:
+            continue
+        # The densest chart in the song is the worst case for the window
+        densest = max(song.charts.values(), key=lambda c: len(c.chords))
+        chords = densest.chords
+        if not chords:
+            continue
+        end = chords[-1].start + 1
+        updates = int(end * rate) + 1
+        tapes = BufferedTape(chords, "start", width), WindowedTape(chords, "start", width, densest.chord_columns.start.tolist())
+        sweeps = [timeit(lambda: sweep(tape, end, rate), repeat) / updates * 1e6 for tape in tapes]
+        scrubs = [timeit(lambda: scrub(tape, end), repeat) * 1000 for tape in tapes]
+        print(f"{chart.parent.name:<48} {len(chords):>8} {updates:>8} {sweeps[0]:>10.2f} {sweeps[1]:>10.2f} {scrubs[0]:>8.2f}ms {scrubs[1]:>8.2f}ms")
+
+
+def strum_shape(chord):
+    if len(chord.notes) > 1:
+        return tuple(chord.shape)
+    return tuple(fret == chord.notes[0].fret for fret in range(5))
+
+
+def mash_inputs(chords, mash, seed=0):
+    """
+    A strum on every chord, `mash` random strums around each one, and a random fret press per strum, in time order
+    """
+    rng = random.Random(seed)
+    inputs = []
+    for chord in chords:
+        inputs.append(StrumEvent(chord.start + rng.uniform(-0.05, 0.05), True, strum_shape(chord)))
+        for _ in range(mash):
+            shape = tuple(rng.random() < 0.4 for _ in range(5))
+            inputs.append(StrumEvent(chord.start + rng.uniform(-0.1, 0.1), True, shape))
+            inputs.append(FretEvent(chord.start + rng.uniform(-0.1, 0.1), True, rng.randrange(5), shape))
+    inputs.sort(key=lambda inp: inp.tracktime)
+    return inputs
+
+
+def play(chart, inputs, rate):
+    """
+    Feed inputs to a fresh HitManager as a `rate` Hz frame loop would, returning how many updates it took
+    """
+    instrument = Instrument(None)
+    hitmanager = HitManager(chart, instrument)
+    end = chart.chord_columns.end[-1] + 1
+    frames = int(end * rate) + 1
+    fed = 0
+    for frame in range(frames):
+        now = frame / rate
+        while fed < len(inputs) and inputs[fed].tracktime <= now:
+            instrument.add_event(inputs[fed])
+            fed += 1
+        hitmanager.update(now)
+        hitmanager.get_events()
+    return frames
+
+
+def bench_hits(charts, repeat, *, rate=120, mashes=(0, 2, 8)):
+    print(f"HitManager at {rate} Hz with random input mashing around every chord (best of {repeat})")
+    print(f"{'chart':<48} {'chords':>8} " + " ".join(f"{f'mash {mash} us/up':>16}" for mash in mashes))
+    for chart in charts:
+        try:
+            with chart.open(encoding="utf-8-sig") as f:
+                song = chchart.load(f)
+        except (raw_chchart.RawLoadException, chchart.LoadException) as e:
+            print(f"{chart.parent.name:<48} {type(e).__name__}")
+            continue
+        if not song.charts:
+            continue
+        # Dense tap/HOPO runs are the worst case for matching
+        densest = max(song.charts.values(), key=lambda c: len(c.chords))
+        if not len(densest.chords):
+            continue
+        results = []
+        for mash in mashes:
+            inputs = mash_inputs(densest.chords, mash)
+            frames = play(densest, inputs, rate)
+            results.append(timeit(lambda: play(densest, inputs, rate), repeat) / frames * 1e6)
+        print(f"{chart.parent.name:<48} {len(densest.chords):>8} " + " ".join(f"{result:>16.2f}" for result in results))
+
+
+benchmarks = {
+    "parser": bench_parser,
+    "memory": bench_memory,
+    "stream": bench_stream,
+    "metadata": bench_metadata,
+    "tape": bench_tape,
+    "hits": bench_hits
+}
+
+
+def main(name=None, *, path=None, repeat=5):
+    if name not in benchmarks:
+        raise InvalidArgException(
+            f"Unrecognized benchmark: {name!r}\n"
+            f"Please use one of the following benchmarks: {' / '.join(benchmarks)}."
+        )
+    repeat = tryint(repeat)
+    if repeat is None or repeat < 1:
+        raise InvalidArgException("Sorry, repeat must be a positive integer.")
+    benchmarks[name](find_charts(path), repeat)
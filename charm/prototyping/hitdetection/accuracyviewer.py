@@ -2,13 +2,28 @@ import pygame.image
 from pygame.surface import Surface
 import pygame.transform
 
+JUDGEMENT_NAMES = ["supercharming", "charming", "excellent", "great", "good", "ok", "miss"]
+# The largest offset (in seconds, either side) for each judgement, anything past the last is a miss
+JUDGEMENT_OFFSETS = [0.01, 0.025, 0.035, 0.045, 0.06, 0.07]
+
+
+def get_judgement_name(offset, offsets = JUDGEMENT_OFFSETS, names = JUDGEMENT_NAMES):
+    index = 0
+    offset = abs(offset)
+    for o in offsets:
+        if o > offset:
+            return names[index]
+        else:
+            index += 1
+    return names[-1]
+
 
 class AccuracyViewer:
     def __init__(self, size = (200, 50)) -> None:
         self.size = size
         self.imagefolder = R".\\charm\\data\\images\\judgements\\"
-        self.judgementnames = ["supercharming", "charming", "excellent", "great", "good", "ok", "miss"]
-        self.offsets = [0.01, 0.025, 0.035, 0.045, 0.06, 0.07]
+        self.judgementnames = JUDGEMENT_NAMES.copy()
+        self.offsets = JUDGEMENT_OFFSETS.copy()
         self.image = Surface(self.size)
 
         self.judgements = {k: pygame.image.load(self.imagefolder + k + ".png") for k in self.judgementnames}
@@ -21,14 +36,7 @@ class AccuracyViewer:
             self.judgements[k] = pygame.transform.smoothscale(v, (w, sh))
 
     def get_judgement_name(self, offset):
-        index = 0
-        offset = abs(offset)
-        for o in self.offsets:
-            if o > offset:
-                return self.judgementnames[index]
-            else:
-                index += 1
-        return self.judgementnames[-1]
+        return get_judgement_name(offset, self.offsets, self.judgementnames)
 
     def hit(self, offset):
         self.image.fill((0, 0, 0, 0))
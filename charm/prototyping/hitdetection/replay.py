@@ -0,0 +1,123 @@
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from charm.lib.instruments.instrument import Instrument, InstrumentEvent
+from charm.lib.instruments.replay import BadReplayException, shape_to_mask
+from charm.prototyping.hitdetection.accuracyviewer import JUDGEMENT_NAMES, JUDGEMENT_OFFSETS, get_judgement_name
+from charm.prototyping.hitdetection.scorecalculator import ChordHit, ChordMissed, ExtraneousInput, HitManager, ScoreCalculator, HIT_WINDOW, batch_hits
+from charm.song import FLAG_FRETS, Chart
+
+# The game loop runs at 120 fps and stamps inputs with the frame's track time, so replays step at the same rate
+REPLAY_RATE = 120
+# Keep going this long after the chart ends, so everything left in the windows is missed or overstrummed
+REPLAY_TAIL = 1
+
+
+@dataclass
+class ReplayResult:
+    score: int
+    streak: int
+    best_streak: int
+    # (tracktime, score, streak) for every change, from ScoreCalculator.states
+    streak_history: List[Tuple[float, int, int]]
+    # How many hits landed in each of AccuracyViewer's offsets, with missed chords under "miss"
+    judgements: Dict[str, int]
+    overstrums: int
+
+
+def checked_events(events: Iterable[InstrumentEvent]) -> Iterator[InstrumentEvent]:
+    """
+    Pass events through, raising BadReplayException on any that aren't in order from 0
+    Replays get submitted from elsewhere, so their times can't be trusted to be sane
+    """
+    last = 0.0
+    for event in events:
+        tracktime = event.tracktime
+        if not math.isfinite(tracktime):
+            raise BadReplayException(f"Replay has an event at {tracktime}")
+        if tracktime < last:
+            raise BadReplayException(f"Replay goes back from {last} to {tracktime}")
+        last = tracktime
+        yield event
+
+
+def score_replay(chart: Chart, events: Iterable[InstrumentEvent], *, rate: float = REPLAY_RATE) -> ReplayResult:
+    """
+    Play a recording of InstrumentEvents (in tracktime order) against chart, without any display or audio
+    Updates happen at `rate` Hz like the game loop, but as fast as the CPU can run them
+    Raises BadReplayException if the events' times are out of order, negative or not finite
+    """
+    instrument = Instrument(None)
+    hitmanager = HitManager(chart, instrument, display=False)
+    scorecalculator = ScoreCalculator(hitmanager)
+    judgements = Counter(dict.fromkeys(JUDGEMENT_NAMES, 0))
+    overstrums = 0
+
+    def score(now):
+        nonlocal overstrums
+        hitmanager.update(now)
+        scored = hitmanager.get_events()
+        for event in scored:
+            if isinstance(event, ChordHit):
+                judgements[get_judgement_name(event.offset)] += 1
+            elif isinstance(event, ChordMissed):
+                judgements["miss"] += 1
+            elif isinstance(event, ExtraneousInput):
+                overstrums += 1
+        scorecalculator.update(now, scored)
+
+    events = checked_events(events)
+    pending = next(events, None)
+    # However long the replay claims to be, only the chart's own length gets played frame by frame
+    end = (float(chart.chord_columns.end[-1]) if len(chart.chord_columns) else 0) + REPLAY_TAIL
+    frame = 0
+    while (now := frame / rate) <= end:
+        while pending is not None and pending.tracktime <= now:
+            instrument.add_event(pending)
+            pending = next(events, None)
+        score(now)
+        frame += 1
+
+    # Nothing's left to hit after the chart, so the rest of the inputs are overstrums, all scored in one update
+    if pending is not None:
+        while pending is not None:
+            instrument.add_event(pending)
+            last_time = pending.tracktime
+            pending = next(events, None)
+        score(last_time + REPLAY_TAIL)
+
+    history = list(scorecalculator.states)
+    return ReplayResult(
+        score=scorecalculator.score,
+        streak=scorecalculator.streak,
+        best_streak=max(streak for _, _, streak in history),
+        streak_history=history,
+        judgements=dict(judgements),
+        overstrums=overstrums
+    )
+
+
+def batch_judgements(chart: Chart, events: Iterable[InstrumentEvent], *, rate: float = REPLAY_RATE) -> Tuple[Dict[str, int], int]:
+    """
+    The judgements and overstrum count score_replay would give, worked out for the whole chart at once with batch_hits
+    Doesn't score anything, since the multiplier depends on the order things happen frame by frame
+    """
+    strums = [event for event in checked_events(events) if event.name == "STRUM_ON"]
+    times = np.array([strum.tracktime for strum in strums], dtype=np.float64)
+    masks = np.array([shape_to_mask(strum.shape) for strum in strums], dtype=np.int64)
+    columns = chart.chord_columns
+    # How many notes each chord has, like len(chord.notes) the flag frets don't count
+    playable = np.concatenate(([0], np.cumsum(~np.isin(chart.note_columns.fret, FLAG_FRETS))))
+    sizes = playable[columns.note_stop] - playable[columns.note_start]
+    chord_input, input_chord = batch_hits(columns.start, columns.fret_mask, sizes, times, masks, window=HIT_WINDOW, rate=rate)
+    hit = chord_input >= 0
+    offsets = np.abs(times[chord_input[hit]] - columns.start[hit])
+    # Same as get_judgement_name: the first offset that's bigger than the hit's
+    counts = np.bincount(np.searchsorted(JUDGEMENT_OFFSETS, offsets, "right"), minlength=len(JUDGEMENT_NAMES))
+    judgements = dict(zip(JUDGEMENT_NAMES, counts.tolist()))
+    judgements["miss"] += int((~hit).sum())
+    return judgements, int((input_chord < 0).sum())
@@ -1,13 +1,21 @@
 from collections import deque
 from math import ceil
+
+import numpy as np
+from numpy import ndarray
+
 from charm.lib.utils import clamp
 from charm.prototyping.hitdetection.accuracyviewer import AccuracyViewer
 from charm.lib.instruments.instrument import Instrument, InstrumentEvent
-from typing import List, Tuple
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
-from charm.song import Chart
+from charm.song import Chart, Chord
 from charm.lib.instruments.guitar import Guitar, StrumEvent
-from charm.lib.tape import BufferedTape
+from charm.lib.tape import WindowedTape
+
+
+# How far either side of a chord (in seconds) a strum can be and still hit it
+HIT_WINDOW = 0.07
 
 
 # --- FUNCTIONS ---
@@ -18,6 +26,96 @@ def anchored_shape(shape: Tuple[bool]):
     return None
 
 
+def highest_frets(masks: ndarray, frets: int = 5) -> ndarray:
+    """
+    anchored_shape for an array of fret bitmasks (green = bit 0), looking at the lowest `frets` bits
+    -1 where nothing is held
+    """
+    masks = np.asarray(masks, dtype=np.int64)
+    anchors = np.full(masks.shape, -1, dtype=np.int64)
+    for fret in range(frets):
+        anchors[(masks >> fret) & 1 == 1] = fret
+    return anchors
+
+
+def delivery_times(times: ndarray, rate: Union[float, None]) -> ndarray:
+    """
+    When inputs reach a HitManager updated at `rate` Hz: the first frame at or after each input
+    """
+    if rate is None:
+        return times
+    frames = np.maximum(np.ceil(times * rate), 0)
+    # Fix up rounding, a frame is "at or after" when frame / rate >= time, exactly like the frame loop checks it
+    frames[frames / rate < times] += 1
+    frames[(frames > 0) & ((frames - 1) / rate >= times)] -= 1
+    return frames / rate
+
+
+def batch_hits(chord_starts: ndarray, chord_masks: ndarray, chord_sizes: ndarray, input_times: ndarray, input_masks: ndarray,
+               *, window: float = HIT_WINDOW, rate: Union[float, None] = None) -> Tuple[ndarray, ndarray]:
+    """
+    Offline version of HitManager's matching over a whole chart at once
+    Chords are start times, fret_masks and note counts; inputs are the strums' times (in order) and shape bitmasks
+    Returns (the input index that hit each chord, the chord index each input hit), -1 for misses and overstrums
+    Pass the rate the HitManager was updated at to account for inputs only being seen on the next frame
+
+    Frame by frame, each chord takes the earliest unused input that is_hit while the chord is still in the window,
+    with earlier chords going first. Every possible (chord, input) pair is found with searchsorted, then the
+    pairs are settled in rounds: every unmatched chord proposes its next input, each input keeps the earliest chord
+    that proposed to it, and the rest try their next input. This ends with the same pairs as going chord by chord.
+    """
+    starts = np.asarray(chord_starts, dtype=np.float64)
+    chord_masks = np.asarray(chord_masks, dtype=np.int64)
+    multi = np.asarray(chord_sizes) > 1
+    times = np.asarray(input_times, dtype=np.float64)
+    input_masks = np.asarray(input_masks, dtype=np.int64)
+    chord_count, input_count = len(starts), len(times)
+    chord_input = np.full(chord_count, -1, dtype=np.int64)
+    input_chord = np.full(input_count, -1, dtype=np.int64)
+    if not chord_count or not input_count:
+        return chord_input, input_chord
+
+    # Every input roughly inside each chord's hit window, as flat (chord, input) pairs ordered by chord then input
+    margin = 1e-9
+    lo = np.searchsorted(times, starts - window - margin, "left")
+    hi = np.searchsorted(times, starts + window + margin, "right")
+    counts = hi - lo
+    pair_chord = np.repeat(np.arange(chord_count), counts)
+    pair_input = np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+
+    # Keep the pairs that would really hit, with the same float comparisons as HitManager and WindowedTape
+    s = starts[pair_chord]
+    t = times[pair_input]
+    delivered = delivery_times(times, rate)[pair_input]
+    hit = ~(np.abs(s - t) > window)
+    hit &= ~(s < delivered - window) & (s <= delivered + window)  # the chord is in the window when the input arrives
+    shape_hit = input_masks[pair_input] == chord_masks[pair_chord] & 0b11111
+    anchor_hit = highest_frets(input_masks)[pair_input] == highest_frets(chord_masks, 8)[pair_chord]
+    hit &= np.where(multi[pair_chord], shape_hit, anchor_hit)
+    pair_chord, pair_input = pair_chord[hit], pair_input[hit]
+
+    # Each chord's pairs run up to `end`, `nxt` is the next one it'll propose
+    nxt = np.searchsorted(pair_chord, np.arange(chord_count), "left")
+    end = np.searchsorted(pair_chord, np.arange(chord_count), "right")
+    active = np.flatnonzero(nxt < end)
+    while active.size:
+        proposed = pair_input[nxt[active]]
+        best = np.where(input_chord >= 0, input_chord, chord_count)
+        np.minimum.at(best, proposed, active)
+        won = best[proposed] == active
+        winners, won_inputs = active[won], proposed[won]
+        # Later chords holding an input an earlier chord just took have to move on too
+        displaced = input_chord[won_inputs]
+        displaced = displaced[displaced >= 0]
+        chord_input[displaced] = -1
+        chord_input[winners] = won_inputs
+        input_chord[won_inputs] = winners
+        retry = np.concatenate((active[~won], displaced))
+        nxt[retry] += 1
+        active = retry[nxt[retry] < end[retry]]
+    return chord_input, input_chord
+
+
 # --- EVENTS ---
 class ScoreEvent:
     def __init__(self, seconds):
@@ -97,7 +195,7 @@ class InputTape:
     def __init__(self, instrument: Instrument, scanner_width: float) -> None:
         self.instrument = instrument
         self.scanner_width = scanner_width * 2
-        self.current_events: List[InstrumentEvent] = []
+        self.current_events: deque[InstrumentEvent] = deque()
         self.current_position = 0
         self.missed_events = []
 
@@ -105,95 +203,155 @@ class InputTape:
         self.current_position = position
         self.current_events.extend(self.instrument.get_events())
         while self.current_events and self.current_position - self.scanner_width > getattr(self.current_events[0], "tracktime"):
-            self.missed_events.append(self.current_events.pop(0))
+            self.missed_events.append(self.current_events.popleft())
 
     def jump_to(self, position: float):
         self.current_position = position
-        self.current_events = []
+        self.current_events = deque()
         self.instrument.get_events()  # dump
 
 
-class ChordTape(BufferedTape):
-    def __init__(self, items: List, tapeattr: str, scanner_width: float) -> None:
-        super().__init__(items, tapeattr, scanner_width)
+class ChordTape(WindowedTape):
+    def __init__(self, items: Sequence, tapeattr: str, scanner_width: float, keys: Optional[Sequence[float]] = None) -> None:
         self.missed_events = []
+        self.hit_indexes = set()
+        super().__init__(items, tapeattr, scanner_width, keys)
 
-    def set_position(self, position: float):
-        if position < self.current_position:
-            self.jump_to(position - self.scanner_width)
-        self.current_position = position
-        self.current_items.extend(self.tape.get_items(position + self.scanner_width))
-        while self.current_items and self.current_position > getattr(self.current_items[0], "start") + self.scanner_width:
-            self.missed_events.append(self.current_items.pop(0))
+    def pending(self) -> Iterator[Tuple[int, Chord]]:
+        """
+        (index, chord) for every chord in the window that hasn't been hit yet
+        """
+        for index in range(self.start, self.stop):
+            if index not in self.hit_indexes:
+                yield index, self.items[index]
+
+    @property
+    def current_items(self) -> List[Chord]:
+        return [chord for _, chord in self.pending()]
+
+    def hit(self, index: int):
+        self.hit_indexes.add(index)
+
+    def expire(self, start: int, stop: int):
+        for index in range(start, stop):
+            if index in self.hit_indexes:
+                self.hit_indexes.remove(index)
+            else:
+                self.missed_events.append(self.items[index])
+
+    def jump_to(self, position: float):
+        super().jump_to(position)
+        self.hit_indexes.clear()
 
 
 class HitManager:
-    def __init__(self, chart: Chart, guitar: Guitar):
+    def __init__(self, chart: Chart, guitar: Guitar, *, display: bool = True):
         self.chart = chart
         self.guitar = guitar
-        self._hitwindow = 0.07
+        self._hitwindow = HIT_WINDOW
 
-        self.chord_tape = ChordTape(self.chart.chords, "start", self._hitwindow)
+        self.chord_tape = ChordTape(self.chart.chords, "start", self._hitwindow, self.chart.chord_columns.start.tolist())
         self.input_tape = InputTape(self.guitar, self._hitwindow)
 
         self._queued_events = []
         self._events = []
 
-        self.accuracyviewer = AccuracyViewer()
+        # Headless hit detection (e.g. scoring replays) has nothing to draw judgements on
+        self.accuracyviewer = AccuracyViewer() if display else None
 
     def update(self, time):
         self.chord_tape.set_position(time)
         self.input_tape.set_position(time)
 
         # TODO: This is super temporary and assumes strums are like finalizers
-        bad_indexes = [i for i, n in enumerate(self.input_tape.current_events) if n.name != "STRUM_ON"]
-        for index in reversed(bad_indexes):
-            self.input_tape.current_events.pop(index)
-
-        remove_chords = []
+        current_events = self.input_tape.current_events
+        strums = [inp for inp in current_events if inp.name == "STRUM_ON"]
 
         # Match chords to inputs
-        for c, chord in enumerate(self.chord_tape.current_items):
-            for i, inp in enumerate(self.input_tape.current_events):
-                if self.is_hit(chord, inp):
-                    remove_chords.append(c)
-                    self.input_tape.current_events.pop(i)
-                    event = ChordHit(inp.tracktime, chord.start)
-                    self._queued_events.append(event)
-                    self.accuracyviewer.hit(event.offset)
-                    break
-
-        # Remove hit chords
-        for chordindex in reversed(remove_chords):
-            self.chord_tape.current_items.pop(chordindex)
+        hits = self.match(self.chord_tape.pending(), strums)
+        for c, chord, _, inp in hits:
+            self.chord_tape.hit(c)
+            event = ChordHit(inp.tracktime, chord.start)
+            self._queued_events.append(event)
+            if self.accuracyviewer is not None:
+                self.accuracyviewer.hit(event.offset)
+
+        # Drop the non-strums and the used strums in one go
+        if hits or len(strums) != len(current_events):
+            used = {i for _, _, i, _ in hits}
+            self.input_tape.current_events = deque([inp for i, inp in enumerate(strums) if i not in used])
 
         # Process missed notes
-        for missed_chord in reversed(self.chord_tape.missed_events):
+        for missed_chord in self.chord_tape.missed_events:
             self._queued_events.append(ChordMissed(time))
-            self.chord_tape.missed_events.remove(missed_chord)
-            self.accuracyviewer.miss()
+            if self.accuracyviewer is not None:
+                self.accuracyviewer.miss()
+        self.chord_tape.missed_events.clear()
 
         # Process overstrums
-        for missed_strum in reversed(self.input_tape.missed_events):
+        for missed_strum in self.input_tape.missed_events:
             if isinstance(missed_strum, StrumEvent):
                 self._queued_events.append(ExtraneousInput(time))
-            self.input_tape.missed_events.remove(missed_strum)
+        self.input_tape.missed_events.clear()
 
         # Process queued events
         self.process_queue()
 
+    def match(self, chords: Iterable[Tuple[int, Chord]], inputs: Sequence[InstrumentEvent]) -> List[Tuple[int, Chord, int, InstrumentEvent]]:
+        """
+        Pair up (index, chord)s and inputs, both in time order, returning (chord index, chord, input index, input) per hit
+        Each chord takes the earliest unused input in its hit window that is_hit, the same as checking every chord
+        against every input, but both sides are walked forwards together so only inputs in the window get checked
+        """
+        hits = []
+        if not inputs:
+            return hits
+        used = set()
+        first = 0
+        window = self._hitwindow
+        for c, chord in chords:
+            start = chord.start
+            # Inputs too early for this chord are too early for every later chord too
+            while first < len(inputs) and start - inputs[first].tracktime > window:
+                first += 1
+            if first == len(inputs):
+                break
+            matches_shape = None
+            for i in range(first, len(inputs)):
+                inp = inputs[i]
+                if inp.tracktime - start > window:
+                    break
+                if i in used:
+                    continue
+                if matches_shape is None:
+                    matches_shape = self.shape_matcher(chord)
+                if matches_shape(inp.shape):
+                    used.add(i)
+                    hits.append((c, chord, i, inp))
+                    break
+        return hits
+
     def process_queue(self):
         self._events = self._queued_events.copy()
         self._queued_events.clear()
 
     def is_hit(self, chord, inp):
-        # if chord.flag == "note":  TODO: all notes are strum rn
         if abs(chord.start - inp.tracktime) > self._hitwindow:
             return False
-        if len(chord.notes) > 1:
-            return inp.shape == tuple(chord.shape)
+        return self.shape_matcher(chord)(inp.shape)
+
+    def shape_matcher(self, chord) -> Callable[[Tuple[bool]], bool]:
+        """
+        The shape half of is_hit, with the chord's notes looked up once so it can be tried against many inputs
+        """
+        # if chord.flag == "note":  TODO: all notes are strum rn
+        notes = chord.notes
+        if len(notes) > 1:
+            shape = tuple(chord.shape)
+            return lambda inp_shape: inp_shape == shape
         else:
-            return chord.notes[0].fret == anchored_shape(inp.shape)
+            fret = notes[0].fret
+            return lambda inp_shape: fret == anchored_shape(inp_shape)
 
     def get_events(self) -> List[ScoreEvent]:
         events = self._events.copy()
@@ -221,8 +379,12 @@ class ScoreCalculator:
         m = clamp(1, ceil(self.streak / 10), 4)
         return m * 2 if self.star_power_active else m
 
-    def update(self, tracktime):
-        events = self.hitmanager.get_events()
+    def update(self, tracktime, events: Optional[List[ScoreEvent]] = None):
+        """
+        Score the hitmanager's new events, or `events` if you've already taken them from it
+        """
+        if events is None:
+            events = self.hitmanager.get_events()
 
         # rewinding
         if tracktime < self.last_time:
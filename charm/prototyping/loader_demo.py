@@ -1,5 +1,10 @@
+import hashlib
+import io
+import json
+import os
+from multiprocessing import Pool
 from operator import itemgetter
-from itertools import islice
+from itertools import chain, islice
 from pathlib import Path
 from traceback import format_exc
 from typing import DefaultDict, Literal, Tuple
@@ -7,12 +12,13 @@ from typing import DefaultDict, Literal, Tuple
 from tqdm import tqdm
 import psutil
 
-from charm.loaders import chchart
+from charm.loaders import chartcache, chchart
 from charm.lib.nip import build_all, zip_all
 from charm.lib.args import InvalidArgException, tryint
 
 
 path_path = Path(".loaderpath")
+results_path = Path(".loaderresults")
 
 
 def save_path(p):
@@ -52,6 +58,26 @@ def input_int(*args, **kwargs):
     return ninput(*args, **kwargs, converter = int)
 
 
+def load_results():
+    """
+    Per-chart results from the last run, as long as they came from the current loader code
+    {path: {"mtime": int, "size": int, "hash": str, "error": [exception name, traceback, unparsed metadata keys] or None}}
+    """
+    try:
+        saved = json.loads(results_path.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+    if saved.get("version") != chartcache.loader_version():
+        return {}
+    return saved["charts"]
+
+
+def save_results(results):
+    tmp = results_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"version": chartcache.loader_version(), "charts": results}))
+    tmp.replace(results_path)
+
+
 def get_input(chart_root=None, in_limit=None, in_filter=None, errlimit=None) -> Tuple[Path, int, Literal["chart", "all"]]:
     """
     Gets user input for runtime options
@@ -114,44 +140,122 @@ def fqcn(o):
         return f"{module}.{o.__class__.__name__}"
 
 
-def process_charts(charts, errlimit):
+def check_chart(chart_path):
+    """
+    Load a single chart
+    Returns (chart_path, suffix, error, record), where error is None or (exception name, traceback, unparsed metadata keys)
+    and record is what gets saved to the results file (None for files that aren't charts)
+    This runs in the worker processes, so everything it returns has to be picklable
+    """
+    suffix = get_suffix(chart_path)
+    if suffix != "chart":
+        return chart_path, suffix, None, None
+
+    stat = chart_path.stat()
+    data = chart_path.read_bytes()
+    record = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": hashlib.sha1(data).hexdigest(), "error": None}
+    try:
+        with io.TextIOWrapper(io.BytesIO(data), encoding = "utf-8 sig") as f:
+            c = chchart.load(f)
+        if c is None:
+            raise DontBeNoneException("Don't be None!")
+    except KeyboardInterrupt as e:
+        raise e
+    except Exception as e:
+        keys = e.keys if isinstance(e, chchart.UnparsedMetadataException) else []
+        record["error"] = (fqcn(e), format_exc(), keys)
+    return chart_path, suffix, record["error"], record
+
+
+def reuse_result(chart_path, record):
+    """
+    Check whether a saved result still applies to a chart
+    The file is only hashed if the size matches but the modification time doesn't
+    """
+    if record is None:
+        return False
+    stat = chart_path.stat()
+    if stat.st_size != record["size"]:
+        return False
+    if stat.st_mtime_ns != record["mtime"]:
+        if hashlib.sha1(chart_path.read_bytes()).hexdigest() != record["hash"]:
+            return False
+        record["mtime"] = stat.st_mtime_ns
+    return True
+
+
+def split_cached(charts, saved):
+    """
+    Split charts into results that can be reused from the last run, and charts that need to be (re)loaded
+    """
+    cached = []
+    fresh = []
+    for chart_path in charts:
+        record = saved.get(str(chart_path))
+        if get_suffix(chart_path) == "chart" and reuse_result(chart_path, record):
+            cached.append((chart_path, "chart", record["error"], record))
+        else:
+            fresh.append(chart_path)
+    return cached, fresh
+
+
+def check_charts(charts, jobs):
+    """
+    Yield check_chart() results, in order for a single job, or as they finish from a pool of worker processes
+    Closing the generator stops the pool
+    """
+    if jobs <= 1:
+        yield from map(check_chart, charts)
+        return
+    with Pool(jobs) as pool:
+        yield from pool.imap_unordered(check_chart, charts, chunksize=4)
+
+
+def process_charts(charts, errlimit, jobs=1, saved=None):
+    """
+    saved is the per-chart results of the last run (see load_results()), and is updated in place with this run's results
+    """
     print("\nProcessing charts...")
 
     bad_charts = []
     unparsed_metadata = set()
     counts = DefaultDict(int)
+    if saved is None:
+        saved = {}
 
     p = psutil.Process()
     basemem = p.memory_info().rss
+    cached, fresh = split_cached(charts, saved)
+    if cached:
+        print(f"Reusing results for {len(cached)} unchanged charts")
+    checked = check_charts(fresh, jobs)
     try:
-        t = tqdm(charts, unit = " charts")
-        for n, chart_path in enumerate(t):
-            suffix = get_suffix(chart_path)
+        t = tqdm(chain(cached, checked), total = len(charts), unit = " charts")
+        for n, (chart_path, suffix, error, record) in enumerate(t):
             if suffix != "chart":
                 counts[suffix] += 1
                 continue
 
-            try:
-                with chart_path.open(encoding = "utf-8 sig") as f:
-                    c = chchart.load(f)
-                if c is None:
-                    raise DontBeNoneException("Don't be None!")
-            except KeyboardInterrupt as e:
-                raise e
-            except Exception as e:
-                if isinstance(e, chchart.UnparsedMetadataException):
-                    unparsed_metadata.update(e.keys)
-                bad_charts.append((chart_path, fqcn(e), format_exc()))
-
-            mem_used = p.memory_info().rss - basemem
-            mem_per_chart = mem_used / (n + 1)
-            t.set_postfix(Nemory=tqdm.format_sizeof(mem_used, "B", 1024), ChartCost=tqdm.format_sizeof(mem_per_chart, "B", 1024))
+            saved[str(chart_path)] = record
+            if error is not None:
+                e_type, e_stack, keys = error
+                unparsed_metadata.update(keys)
+                bad_charts.append((chart_path, e_type, e_stack))
+
+            # The workers' memory isn't ours to measure
+            if jobs <= 1:
+                mem_used = p.memory_info().rss - basemem
+                mem_per_chart = mem_used / (n + 1)
+                t.set_postfix(Nemory=tqdm.format_sizeof(mem_used, "B", 1024), ChartCost=tqdm.format_sizeof(mem_per_chart, "B", 1024))
             counts[suffix] += 1
-            if len(bad_charts) >= errlimit:
+            # 0 is unlimited
+            if errlimit and len(bad_charts) >= errlimit:
                 print(f"Stopping after reaching maximum number of errors: {errlimit}")
                 break
     except KeyboardInterrupt:
-        print(f"CTRL-C received. Stopped processing after {max(counts.values())} charts.")
+        print(f"CTRL-C received. Stopped processing after {max(counts.values(), default=0)} charts.")
+    finally:
+        checked.close()
     return bad_charts, sorted(unparsed_metadata), counts.items()
 
 
@@ -217,7 +321,7 @@ def gen_output(raw_errors, error_counts, counts, unparsed_metadata):
     return "\n".join(lines)
 
 
-def run(chart_root: Path, in_limit: int, in_filter: Literal["chart", "all"], errlimit: int):
+def run(chart_root: Path, in_limit: int, in_filter: Literal["chart", "all"], errlimit: int, jobs: int = 1):
     # Clone Hero requires charts be named "notes.chart" or "notes.mid[i]."
     if in_filter == "chart":
         glob_filter = "notes.chart"
@@ -230,7 +334,9 @@ def run(chart_root: Path, in_limit: int, in_filter: Literal["chart", "all"], err
     charts = list(tqdm(charts_iter, unit = " charts"))
     print(f"{len(charts)} charts found")
 
-    bad_charts, unparsed_metadata, counts = process_charts(charts, errlimit)
+    saved = load_results()
+    bad_charts, unparsed_metadata, counts = process_charts(charts, errlimit, jobs, saved)
+    save_results(saved)
     raw_errors, error_counts, sources, full_errors = process_errors(bad_charts, chart_root)
     out = gen_output(raw_errors, error_counts, counts, unparsed_metadata)
 
@@ -241,7 +347,7 @@ def run(chart_root: Path, in_limit: int, in_filter: Literal["chart", "all"], err
     # zip_all(zip_path, copy = sources, create = full_errors | {"log.txt": out}, progress = True)
 
 
-def check_args(path, limit, filter, errlimit):
+def check_args(path, limit, filter, errlimit, jobs):
     if path is not None:
         path = Path(path)
         if not path.exists():
@@ -265,13 +371,24 @@ def check_args(path, limit, filter, errlimit):
         if errlimit is None or errlimit < 0:
             raise InvalidArgException(f"Sorry, {errlimit} is not a valid error limit, try a positive integer or 'unlimited' or 'none'.")
 
-    return path, limit, filter, errlimit
+    # None is a single process, 0 is one worker per CPU
+    if jobs is None:
+        jobs = 1
+    else:
+        if jobs == "auto":
+            jobs = 0
+        n_jobs = tryint(jobs)
+        if n_jobs is None or n_jobs < 0:
+            raise InvalidArgException(f"Sorry, {jobs} is not a valid number of jobs, try a positive integer or 'auto'.")
+        jobs = n_jobs or os.cpu_count() or 1
+
+    return path, limit, filter, errlimit, jobs
 
 
-def main(*, path=None, limit=None, filter=None, errlimit=None):
-    chart_root, limit, filter, errlimit = check_args(path, limit, filter, errlimit)
+def main(*, path=None, limit=None, filter=None, errlimit=None, jobs=None):
+    chart_root, limit, filter, errlimit, jobs = check_args(path, limit, filter, errlimit, jobs)
     try:
         chart_root, in_limit, in_filter, errlimit = get_input(chart_root=chart_root, in_limit=limit, in_filter=filter, errlimit=errlimit)
-        run(chart_root, in_limit, in_filter, errlimit)
+        run(chart_root, in_limit, in_filter, errlimit, jobs)
     except KeyboardInterrupt:
         print("Goodbye")
@@ -14,23 +14,17 @@ class LyricAnimator:
         self.width, self.height = size
         self.font = font
         self._image = None
+        self.tracktime = 0.0
         self.track_ticks = 0
+        self.phrase_index = self.chart.song.lyric_by_ticks.lteq_index(self.track_ticks)
         self.last_drawn = None
         self.show_next = show_next
         self.show_baseline = show_baseline
 
-    @property
-    def tracktime(self):
-        return self.ticks_to_secs(self.track_ticks)
-
     @property
     def song(self):
         return self.chart.song
 
-    @property
-    def phrase_index(self):
-        return self.chart.song.lyric_by_ticks.lteq_index(self.track_ticks)
-
     @property
     def prev_phrase_index(self):
         curr_index = self.phrase_index
@@ -51,7 +45,9 @@ class LyricAnimator:
 
     @property
     def curr_phrase(self):
-        return self.chart.song.lyric_by_ticks.lteq(self.track_ticks)
+        if self.phrase_index is None:
+            return None
+        return self.chart.song.lyrics[self.phrase_index]
 
     @property
     def next_phrase(self):
@@ -118,7 +114,10 @@ class LyricAnimator:
         return surf
 
     def update(self, tracktime):
+        self.tracktime = tracktime
         self.track_ticks = self.secs_to_ticks(tracktime)
+        # Everything else reads the current phrase, so only look it up once per frame
+        self.phrase_index = self.chart.song.lyric_by_ticks.lteq_index(self.track_ticks)
 
     @property
     def image(self) -> pygame.Surface:
@@ -1,4 +1,3 @@
-from glob import glob
 from pathlib import Path
 from typing import Dict, List
 
@@ -9,7 +8,7 @@ from pygame import Surface
 from pygame import K_UP, K_DOWN
 
 from ...lib.pgutils import stacksurfs
-from ...loaders import chchart
+from ...loaders.library import SongLibrary
 
 
 class MenuItem:
@@ -62,20 +61,19 @@ class Game(nygame.Game):
     def load_self(self):
 
         songpath = Path(self.path)
-        songfolder = songpath.as_posix()
 
-        charts = glob(songfolder + R"/**/notes.chart", recursive = True)
-        chartfolders = [Path(p).parent for p in charts]
+        # Only charts that changed since the last run get scanned
+        library = SongLibrary()
+        songs = library.refresh(songpath)
+        library.close()
 
         self.data: List[Dict] = []
-        for chart in chartfolders:
-            songpath = chart / "notes.chart"
-            with songpath.open("r", encoding="utf-8") as f:
-                song = chchart.load(f)
+        for song in songs:
+            chart = Path(song["path"]).parent
             self.data.append({
                 "path": chart,
-                "title": song.title,
-                "artist": song.artists,
+                "title": song["title"],
+                "artist": song["artist"],
                 "playlist": chart.parent.stem
             })
 
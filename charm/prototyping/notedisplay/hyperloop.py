@@ -1,10 +1,12 @@
 from charm.lib.instruments.guitar import Guitar
+from functools import lru_cache
 from importlib import resources as pkg_resources
 from itertools import count, takewhile
 import math
 from pathlib import Path
 from typing import Callable, List, Optional, Tuple
 
+import numpy as np
 from nygame import DigiText as T
 import pygame
 import pygame.transform
@@ -15,7 +17,7 @@ from pygame.surface import Surface
 from pygame.constants import SRCALPHA
 
 from charm.lib.instruments.instrument import Instrument
-from charm.lib.pgutils import Quad, warp_surface
+from charm.lib.pgutils import Quad, Warper
 from charm.song import Chart, Chord
 from charm.prototyping.notedisplay.inputdisplay import InputDisplay, init as input_init
 
@@ -33,6 +35,39 @@ def init():
         sprite_sheet = SpriteSheet.load(p)
 
 
+@lru_cache(maxsize=4)
+def load_bg(img: str, size: Tuple[int, int]) -> Tuple[int, Surface, Surface]:
+    """
+    Decode and tile a highway image (and its _sp star power version) to fill a hyperloop of the given size
+    Cached, so every chart after the first reuses the same tiled surfaces
+    """
+    imgsplit = img.rsplit(".", 1)
+    spimg = imgsplit[0] + "_sp." + imgsplit[1]
+    bg_tile = pygame.image.load(img)
+    bg_tile.convert_alpha()
+    bg_tile_sp = pygame.image.load(spimg)
+    bg_tile_sp.convert_alpha()
+    w, h = size
+    # Scale height to fit hyperloop width but maintain aspect ratio.
+    aspect = bg_tile.get_rect().height / bg_tile.get_rect().width
+    tile_height = int(w * aspect)
+    bg_tile = pygame.transform.smoothscale(bg_tile, (w, tile_height))
+    bg_tile_sp = pygame.transform.smoothscale(bg_tile_sp, (w, tile_height))
+
+    tile_count = (math.ceil(h / tile_height) + 1)
+    full_height = tile_height * tile_count
+
+    rect = bg_tile.get_rect()
+    bg_image = Surface((w, full_height))
+    bg_image_sp = Surface((w, full_height))
+
+    for i in range(tile_count):
+        rect.y = i * tile_height
+        bg_image.blit(bg_tile, rect)
+        bg_image_sp.blit(bg_tile_sp, rect)
+    return tile_height, bg_image, bg_image_sp
+
+
 class HyperloopDisplay:
     def __init__(self, chart: Chart, instrument: Optional[Instrument], *, size: Tuple[int, int] = (400, 400), lefty: bool = False, hitwindow_vis: bool = False, beatbounce: bool = True, bg: Optional[str] = None):
         self.chart = chart
@@ -44,12 +79,17 @@ class HyperloopDisplay:
         self.bg: Optional[Path] = None if bg is None else Path(bg)
         self.tracktime: float = 0.0
         self.track_ticks: int = 0
+        self.end: int = 0
         self.length: float = 0.75
         self.note_limit: int = 150
         self.lanes = 5  # TODO: HARDCODE
         self.strike_fadetime = 0.5
         self.visible_chords: List[Chord] = []
-        self._image = Surface(size, SRCALPHA)
+        # The latest tick any chord so far sustains to, which only ever goes up, unlike the chords' own tick_end
+        self.sustain_ends = np.maximum.accumulate(chart.chord_columns.tick_end)
+        self._canvas = Surface(size, SRCALPHA)
+        self._image = self._canvas
+        self._warper: Optional[Warper] = None
         self.bg_tile_height = 0
         self.bg_image: Optional[Surface] = None
         self.bg_image_sp: Optional[Surface] = None
@@ -69,10 +109,6 @@ class HyperloopDisplay:
     def px_per_sec(self):
         return self.size[1] / self.length
 
-    @property
-    def end(self):
-        return self.secs_to_ticks(self.tracktime + self.length)
-
     def get_visible_beats(self) -> Tuple[List[float], List[float], List[float]]:
         # This needs to be updated to handle multiple timesigs
         timesig = self.chart.song.timesig_by_ticks.lteq(self.track_ticks)
@@ -113,38 +149,19 @@ class HyperloopDisplay:
     def create_bg(self):
         if self.bg is None:
             return
-        img = str(self.bg)
-        imgsplit = img.rsplit(".", 1)
-        spimg = imgsplit[0] + "_sp." + imgsplit[1]
-        bg_tile = pygame.image.load(img)
-        bg_tile.convert_alpha()
-        bg_tile_sp = pygame.image.load(spimg)
-        bg_tile_sp.convert_alpha()
-        w, h = self.size
-        # Scale height to fit hyperloop width but maintain aspect ratio.
-        aspect = bg_tile.get_rect().height / bg_tile.get_rect().width
-        tile_height = int(w * aspect)
-        bg_tile = pygame.transform.smoothscale(bg_tile, (w, tile_height))
-        bg_tile_sp = pygame.transform.smoothscale(bg_tile_sp, (w, tile_height))
-
-        tile_count = (math.ceil(h / tile_height) + 1)
-        full_height = tile_height * tile_count
-
-        rect = bg_tile.get_rect()
-        self.bg_tile_height = tile_height
-        self.bg_image = Surface((w, full_height))
-        self.bg_image_sp = Surface((w, full_height))
-
-        for i in range(tile_count):
-            rect.y = i * tile_height
-            self.bg_image.blit(bg_tile, rect)
-            self.bg_image_sp.blit(bg_tile_sp, rect)
+        self.bg_tile_height, self.bg_image, self.bg_image_sp = load_bg(str(self.bg), self.size)
 
     def update(self, tracktime: float):
         self.tracktime = tracktime
         self.track_ticks = self.secs_to_ticks(tracktime)
-        important_chords = list(c for c in self.chart.chord_by_ticks[0:self.end] if c.tick_end >= self.track_ticks)
-        earliest_visible_tick = min(c.tick_start for c in important_chords) if important_chords else self.track_ticks
+        self.end = self.secs_to_ticks(self.tracktime + self.length)
+        # Chords from before now stay visible while they're still sustaining, the first of them is a binary search away
+        ringing = int(np.searchsorted(self.sustain_ends, self.track_ticks, "left"))
+        starts = self.chart.chord_columns.tick_start
+        if ringing < len(starts) and starts[ringing] < self.end:
+            earliest_visible_tick = int(starts[ringing])
+        else:
+            earliest_visible_tick = self.track_ticks
         self.visible_chords = self.chart.chord_by_ticks[earliest_visible_tick:self.end]
         last_fade = self.secs_to_ticks(self.tracktime - self.strike_fadetime)
         self.old_chords: List[Chord] = self.chart.chord_by_ticks[last_fade:self.track_ticks]
@@ -152,6 +169,8 @@ class HyperloopDisplay:
             self.id.update()
 
     def draw(self):
+        # Flipping and tilting swap _image for another surface, always start again from the canvas
+        self._image = self._canvas
         self._image.fill("clear")
 
         if self.sp:
@@ -178,21 +197,21 @@ class HyperloopDisplay:
 
     def project(self):
         w, h = self.size
-        self._image = warp_surface(self._image,
-                                   Quad((0, 0), (w, 0), (w, h), (0, h)),
-                                   Quad((w * 0.25, h / 2.5), (w * 0.75, h / 2.5), (w, h), (0, h)))
+        if self._warper is None or self._warper.size != (w, h):
+            self._warper = Warper((w, h),
+                                  Quad((0, 0), (w, 0), (w, h), (0, h)),
+                                  Quad((w * 0.25, h / 2.5), (w * 0.75, h / 2.5), (w, h), (0, h)))
+        self._image = self._warper.warp(self._image)
 
     def draw_beatlines(self):
         measures, beats, quarterbeats = self.get_visible_beats()
-        for q in quarterbeats:
-            y = self.gety(self.ticks_to_secs(int(q)))
-            pygame.draw.line(self._image, (64, 64, 64), (0, y), (self.size[0], y), width = 1)
-        for b in beats:
-            y = self.gety(self.ticks_to_secs(int(b)))
-            pygame.draw.line(self._image, (128, 128, 128), (0, y), (self.size[0], y), width = 1)
-        for m in measures:
-            y = self.gety(self.ticks_to_secs(int(m)))
-            pygame.draw.line(self._image, (128, 128, 128), (0, y), (self.size[0], y), width = 5)
+        ticks_to_secs = self.chart.song.tempo_calc.ticks_to_secs_array
+        for q in self.gety(ticks_to_secs(np.array(quarterbeats, dtype=int))).tolist():
+            pygame.draw.line(self._image, (64, 64, 64), (0, q), (self.size[0], q), width = 1)
+        for b in self.gety(ticks_to_secs(np.array(beats, dtype=int))).tolist():
+            pygame.draw.line(self._image, (128, 128, 128), (0, b), (self.size[0], b), width = 1)
+        for m in self.gety(ticks_to_secs(np.array(measures, dtype=int))).tolist():
+            pygame.draw.line(self._image, (128, 128, 128), (0, m), (self.size[0], m), width = 5)
 
     def draw_strikes(self):
         fret_strikes = [0.0] * self.lanes
@@ -234,34 +253,53 @@ class HyperloopDisplay:
         x = self.get_fretx(fretnum)
         y = self.gety(secs)
         spnote = False if spnote is None else True
-        sprite = sprite_sheet.get(fretnum=fretnum, mode=mode, spact=spact, spnote=spnote)
+        sprite = sprite_sheet.get(fretnum=fretnum, mode=mode, spact=spact, spnote=spnote, alpha=255 * fade)
         # Center fret sprites
         # x -= sprite.get_width() / 2
         # y -= sprite.get_height() / 2
-        sprite.set_alpha(255 * fade)
         if length != 0:
             sustain_img = sprite_sheet.get(fretnum=fretnum, mode="sustainbody", spact=spact)
             sustaincap_img = sprite_sheet.get(fretnum=fretnum, mode="sustaintop", spact=spact)
+            width, cap_width = sustain_img.get_width(), sustaincap_img.get_width()
             if self.instrument and isinstance(self.instrument, Guitar) and y >= (self.size[1] - sprite.get_height()):
                 whammy_amount = self.instrument.whammy_pos + 1
-                sustain_img = pygame.transform.smoothscale(sustain_img, (int(sustain_img.get_width() * whammy_amount), sustain_img.get_height()))
-                sustaincap_img = pygame.transform.smoothscale(sustaincap_img, (int(sustaincap_img.get_width() * whammy_amount), sustaincap_img.get_height()))
-            width = sustain_img.get_width()
+                width, cap_width = int(width * whammy_amount), int(cap_width * whammy_amount)
+            sustaincap_img = sprite_sheet.get(fretnum=fretnum, mode="sustaintop", spact=spact, width=cap_width)
             height = math.ceil(length * self.px_per_sec) - sustaincap_img.get_height()
-            sustain_img = pygame.transform.scale(sustain_img, (width, height))
             sx = self.get_fretx(fretnum)
             sy = self.gety(secs)
-            sustain_dest = sustain_img.get_rect()
-            sustain_dest.midbottom = (sx, sy)
+            self.draw_sustain(fretnum, spact, width, sx, sy, height)
             sustaincap_dest = sustaincap_img.get_rect()
-            sustaincap_dest.midbottom = sustain_dest.midtop
-            self._image.blit(sustain_img, sustain_dest)
+            sustaincap_dest.midbottom = (sx, sy - max(height, 0))
             self._image.blit(sustaincap_img, sustaincap_dest)
         if secs >= self.tracktime:
             rect = sprite.get_rect()
             rect.center = (x, y)
             self._image.blit(sprite, rect)
 
+    def draw_sustain(self, fretnum: int, spact: bool, width: int, x: float, bottom: float, height: int):
+        """
+        Draw a sustain body `height` pixels tall up from `bottom`, clipped from one long strip instead of scaling it per frame
+        The strip is the body sprite with its last row carried on a highway's height below it,
+        so only the part on screen is ever drawn, however long the sustain is
+        """
+        body = sprite_sheet.get(fretnum=fretnum, mode="sustainbody", spact=spact)
+        top = bottom - height
+        visible_top = max(top, 0)
+        visible_bottom = min(bottom, self.size[1])
+        if visible_bottom <= visible_top:
+            return
+        strip_height = self.size[1] + body.get_height()
+        strip = sprite_sheet.get(fretnum=fretnum, mode="sustainbody", spact=spact, width=width, height=strip_height, extend=True)
+        visible_height = math.ceil(visible_bottom - visible_top)
+        # The strip's top sits just under the cap, past the end of the strip every row is the same anyway
+        offset = min(int(visible_top - top), strip_height - visible_height)
+        area = Rect(0, offset, strip.get_width(), visible_height)
+        dest = area.copy()
+        dest.centerx = x
+        dest.top = visible_top
+        self._image.blit(strip, dest, area)
+
     def draw_bg(self, bg_image: Surface):
         bg_rect = bg_image.get_rect()
         offset = ((self.tracktime * self.px_per_sec) % self.bg_tile_height) - self.bg_tile_height
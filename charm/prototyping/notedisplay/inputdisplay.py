@@ -51,6 +51,9 @@ fret_images = {}
 
 def init():
     global gh_sheet
+    # Every HyperloopDisplay calls this, so only decode the sheet once
+    if gh_sheet is not None:
+        return
     with pkg_resources.path(image_folder, "gh.png") as p:  # TODO: HARDCODE
         gh_sheet = SpriteSheet.load(p)
 
@@ -1,8 +1,10 @@
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Literal, Optional
+from typing import Callable, List, Literal, NamedTuple, Optional
 
 import pygame.image
 import pygame.transform
+from pygame.constants import BLEND_RGBA_MAX, BLEND_RGBA_MULT, SRCALPHA
 from pygame.surface import Surface
 from pygame.rect import Rect
 
@@ -40,6 +42,56 @@ SPRITEMAP_X = [
 ]
 
 
+# Baked alpha is rounded to one of this many levels, so fades reuse a handful of variants
+ALPHA_LEVELS = 32
+# Stretched widths (e.g. whammied sustains) are rounded to a multiple of this many pixels
+WIDTH_STEP = 4
+# Enough for every strike at every alpha level, with and without star power
+FADED_CACHE_SIZE = 512
+# Stretched sprites (sustain strips most of all) are big, and whammy only needs a few widths at a time
+STRETCHED_CACHE_SIZE = 128
+
+
+class VariantCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+
+class VariantCache:
+    """
+    A least recently used cache of baked sprite variants, counting how well it's doing
+    """
+    def __init__(self, maxsize: int):
+        self.variants: "OrderedDict[tuple, Surface]" = OrderedDict()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple, bake: Callable[[], Surface]) -> Surface:
+        variant = self.variants.get(key)
+        if variant is not None:
+            self.hits += 1
+            self.variants.move_to_end(key)
+            return variant
+        self.misses += 1
+        variant = self.variants[key] = bake()
+        if len(self.variants) > self.maxsize:
+            self.variants.popitem(last=False)
+            self.evictions += 1
+        return variant
+
+    def info(self) -> VariantCacheInfo:
+        return VariantCacheInfo(self.hits, self.misses, self.evictions, len(self.variants), self.maxsize)
+
+    def clear(self):
+        self.variants.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
 class Sprite():
     def __init__(self, fretname: FretName, fretnum: FretNum, mode: Mode, spnote: bool, spact: bool, img: Surface):
         self.fretname: FretName = fretname
@@ -53,21 +105,72 @@ class Sprite():
 class SpriteSheet:
     SPRITE_SIZE = 64
 
-    def __init__(self, sprites: List[Sprite]):
+    def __init__(self, sprites: List[Sprite], *, faded_size: int = FADED_CACHE_SIZE, stretched_size: int = STRETCHED_CACHE_SIZE):
         self.sprites = sprites
         self.fretname_index = {(spr.fretname, spr.mode, spr.spnote, spr.spact): spr.img for spr in sprites}
         self.fretnum_index = {(spr.fretnum, spr.mode, spr.spnote, spr.spact): spr.img for spr in sprites}
+        # Fades are a small set that's wanted every frame, kept apart so stretched sprites can't push them out
+        self.faded = VariantCache(faded_size)
+        self.stretched = VariantCache(stretched_size)
 
-    def get(self, *, fretname: Optional[FretName] = None, fretnum: Optional[FretNum] = None, mode: Mode = "note", spnote: bool = False, spact: bool = False) -> Surface:
+    def get(self, *, fretname: Optional[FretName] = None, fretnum: Optional[FretNum] = None, mode: Mode = "note", spnote: bool = False, spact: bool = False,
+            alpha: float = 255, width: Optional[int] = None, height: Optional[int] = None, extend: bool = False) -> Surface:
+        """
+        The sprite for a fret, or a cached variant of it faded to `alpha` and/or stretched to `width` and `height`
+        With extend=True the sprite isn't stretched to `height`, its bottom row is repeated down to it instead
+        Sprites are shared, so draw them as they are and ask for a variant instead of changing them
+        """
         if fretname is not None and fretnum is not None:
             raise ValueError("fretname or fretnum arguments are mutually exclusive.")
 
         if fretname is not None:
-            return self.fretname_index[(fretname, mode, spnote, spact)]
+            img = self.fretname_index[(fretname, mode, spnote, spact)]
         elif fretnum is not None:
-            return self.fretnum_index[(fretnum, mode, spnote, spact)]
+            img = self.fretnum_index[(fretnum, mode, spnote, spact)]
+        else:
+            raise ValueError("Either fretname or fretnum argument must be provided.")
+
+        level = round(min(max(alpha, 0), 255) / 255 * (ALPHA_LEVELS - 1))
+        if width is None or width == img.get_width():
+            width = img.get_width()
+        else:
+            width = max(round(width / WIDTH_STEP) * WIDTH_STEP, 0)
+        height = img.get_height() if height is None else max(height, 0)
+        if level == ALPHA_LEVELS - 1 and (width, height) == img.get_size():
+            return img
+
+        cache = self.faded if (width, height) == img.get_size() else self.stretched
+        return cache.get((img, level, width, height, extend), lambda: self.bake(img, level * 255 // (ALPHA_LEVELS - 1), width, height, extend))
+
+    @staticmethod
+    def bake(img: Surface, alpha: int, width: int, height: int, extend: bool = False) -> Surface:
+        if width != img.get_width():
+            # Smooth, since this is how whammied sustains wobble
+            img = pygame.transform.smoothscale(img, (width, img.get_height()))
+        if extend and height > img.get_height():
+            extended = Surface((width, height), SRCALPHA, img)
+            # Onto an empty surface MAX copies the pixels as they are, rather than blending them
+            extended.blit(img, (0, 0), special_flags=BLEND_RGBA_MAX)
+            bottom_row = img.subsurface((0, img.get_height() - 1, width, 1))
+            extended.blit(pygame.transform.scale(bottom_row, (width, height - img.get_height())), (0, img.get_height()), special_flags=BLEND_RGBA_MAX)
+            img = extended
+        elif height != img.get_height():
+            img = pygame.transform.scale(img, (width, height))
+        else:
+            img = img.copy()
+        if alpha != 255:
+            img.fill((255, 255, 255, alpha), special_flags=BLEND_RGBA_MULT)
+        return img
+
+    def cache_info(self) -> VariantCacheInfo:
+        """
+        Both variant caches' counts added together, see faded.info() and stretched.info() for each one
+        """
+        return VariantCacheInfo(*(a + b for a, b in zip(self.faded.info(), self.stretched.info())))
 
-        raise ValueError("Either fretname or fretnum argument must be provided.")
+    def cache_clear(self):
+        self.faded.clear()
+        self.stretched.clear()
 
     @classmethod
     def load(cls, p: Path):
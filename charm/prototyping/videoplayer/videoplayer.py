@@ -4,21 +4,9 @@ import arrow
 import numpy
 
 import nygame
-import pygame
 from pygame.surface import Surface
 
-
-def cv2pg(frame_yx_bgr: numpy.ndarray) -> numpy.ndarray:
-    frame_yx_rgb = cv2.cvtColor(frame_yx_bgr, cv2.COLOR_BGR2RGB)
-    frame_xy_rgb = frame_yx_rgb.swapaxes(0, 1)
-    return frame_xy_rgb
-
-
-def rescale_frame(frame, scale):
-    width = int(frame.shape[1] * scale)
-    height = int(frame.shape[0] * scale)
-    dim = (width, height)
-    return cv2.resize(frame, dim, interpolation =cv2.INTER_AREA)
+from charm.lib.pgutils import write_bgr
 
 
 class VideoPlayer:
@@ -37,22 +25,43 @@ class VideoPlayer:
 
         self.size = int(width), int(self.orig_height * self.scale)
 
-        self.image = Surface(self.size)
+        self.image = Surface(self.size, 0, 32)
+        # cv2 decodes into these again every frame, instead of allocating new ones
+        self.read_buffer = None
+        self.scaled_buffer = None
 
-    def get_frame(self, time: float) -> numpy.ndarray:
+    def read(self, time: float) -> bool:
+        """
+        Read up to `time`, scaling the last frame read into self.frame, returning whether there was a new frame
+        """
+        read = False
         while self.cap.get(cv2.CAP_PROP_POS_MSEC) < time * 1000:
-            frame = self.cap.read()[1]
-            if frame is None:
-                return
-            if self.scale != 1:
-                frame = rescale_frame(frame, self.scale)
-            self.frame = cv2pg(frame)
+            ok, frame = self.cap.read(self.read_buffer)
+            if not ok:
+                break
+            self.read_buffer = frame
+            read = True
+        if not read:
+            return False
+        # Only the last frame read ever gets seen, so only that one is scaled
+        if self.read_buffer.shape[1::-1] != self.size:
+            self.scaled_buffer = cv2.resize(self.read_buffer, self.size, dst=self.scaled_buffer, interpolation=cv2.INTER_AREA)
+            self.frame = self.scaled_buffer
+        else:
+            self.frame = self.read_buffer
+        return True
+
+    def get_frame(self, time: float) -> numpy.ndarray:
+        """
+        The latest (height, width, 3) BGR frame at `time`, at the player's size
+        The array is reused for every frame, so copy it to keep it
+        """
+        self.read(time)
         return self.frame
 
     def update(self, time):
-        frame = self.get_frame(time)
-        if frame is not None:
-            pygame.surfarray.blit_array(self.image, frame)
+        if self.read(time):
+            write_bgr(self.frame, self.image)
 
 
 class Game(nygame.Game):
@@ -61,7 +70,8 @@ class Game(nygame.Game):
         self.videoplayer = VideoPlayer("C:/Users/digid/Videos/Awoken.mp4")
 
     def render_video(self, time: float):
-        pygame.surfarray.blit_array(self.surface, self.videoplayer.get_frame(time))
+        self.videoplayer.update(time)
+        self.surface.blit(self.videoplayer.image, (0, 0))
 
     def loop(self, events):
         now = arrow.now()
@@ -1,36 +1,46 @@
 from __future__ import annotations
 
-from functools import cache, total_ordering
-from typing import Dict, List, Optional
+from bisect import bisect_right
+from collections.abc import Sequence
+from functools import lru_cache, total_ordering
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 from nindex import Index
+from numpy import ndarray
+
+CHORD_FLAGS = ("note", "forced", "tap", "hopo")
+FLAG_CODES = {flag: code for code, flag in enumerate(CHORD_FLAGS)}
+FLAG_FRETS = (5, 6)  # .chart uses these "frets" to mark forced and tap chords
+# The game converts the current track time several times a frame, so a few seconds of frames is plenty
+TEMPO_CACHE_SIZE = 1024
+# Every chord shares one of these 32 shape tuples instead of building its own
+SHAPES = tuple(tuple(bool(mask & (1 << fret)) for fret in range(5)) for mask in range(32))
+
+
+@lru_cache(maxsize=None)
+def mask_to_frets(mask: int) -> Tuple[int]:
+    return tuple(fret for fret in range(mask.bit_length()) if mask & (1 << fret))
 
 
 # Abstract class
 @total_ordering
-class SongEvent():
-    def __init__(self, song: Song, tick_start: int, tick_length: Optional[int] = None):
-        self.song = song
-        self.tick_start = tick_start
-        self.tick_length = tick_length or 0
-
-    @property
-    def start(self) -> float:
-        return self.song.tempo_calc.ticks_to_secs(self.tick_start)
+class TimedEvent():
+    """
+    What every event can do with just its ticks and times, without storing anything itself
+    The column views (Note and Chord) get theirs from the chart, everything else is a SongEvent
+    """
+    __slots__ = ()
 
     @property
     def tick_end(self) -> int:
         return self.tick_start + self.tick_length
 
-    @property
-    def end(self) -> float:
-        return self.song.tempo_calc.ticks_to_secs(self.tick_end)
-
     @property
     def length(self) -> float:
         return self.end - self.start
 
-    def contains(self, other: SongEvent) -> bool:
+    def contains(self, other: TimedEvent) -> bool:
         return self.tick_start <= other.tick_start and self.tick_end >= other.tick_end
 
     def __eq__(self, other):
@@ -40,17 +50,74 @@ class SongEvent():
         return (self.tick_start, self.tick_length) < (other.tick_start, other.tick_length)
 
 
+# Abstract class
+class SongEvent(TimedEvent):
+    __slots__ = ("song", "tick_start", "tick_length", "_start", "_end")
+
+    def __init__(self, song: Song, tick_start: int, tick_length: Optional[int] = None):
+        self.song = song
+        self.tick_start = tick_start
+        self.tick_length = tick_length or 0
+        # Filled in by TempoCalculator.set_times() when the song is finalized
+        self._start: Optional[float] = None
+        self._end: Optional[float] = None
+
+    @property
+    def start(self) -> float:
+        if self._start is None:
+            return self.song.tempo_calc.ticks_to_secs(self.tick_start)
+        return self._start
+
+    @property
+    def end(self) -> float:
+        if self._end is None:
+            return self.song.tempo_calc.ticks_to_secs(self.tick_end)
+        return self._end
+
+
 # Abstract class
 class ChartEvent(SongEvent):
+    __slots__ = ("chart",)
+
     def __init__(self, song: Song, chart: Chart, tick_start: int, tick_length: int = None):
         super().__init__(song, tick_start, tick_length)
         self.chart = chart
 
 
-class Note(ChartEvent):
-    def __init__(self, song: Song, chart: Chart, tick_start: int, fret: int, tick_length: int):
-        super().__init__(song, chart, tick_start, tick_length)
-        self.fret = fret
+class Note(TimedEvent):
+    """
+    A lightweight view of one row of a Chart's NoteColumns
+    Notes are only created when something asks for them
+    """
+    __slots__ = ("chart", "index")
+
+    def __init__(self, chart: Chart, index: int):
+        self.chart = chart
+        self.index = index
+
+    @property
+    def song(self) -> Song:
+        return self.chart.song
+
+    @property
+    def tick_start(self) -> int:
+        return int(self.chart.note_columns.tick_start[self.index])
+
+    @property
+    def tick_length(self) -> int:
+        return int(self.chart.note_columns.tick_length[self.index])
+
+    @property
+    def fret(self) -> int:
+        return int(self.chart.note_columns.fret[self.index])
+
+    @property
+    def start(self) -> float:
+        return float(self.chart.note_columns.start[self.index])
+
+    @property
+    def end(self) -> float:
+        return float(self.chart.note_columns.end[self.index])
 
     def __eq__(self, other):
         return (self.tick_start, self.fret, self.tick_length) == (other.tick_start, other.fret, other.tick_length)
@@ -63,6 +130,8 @@ class Note(ChartEvent):
 
 
 class SPEvent(ChartEvent):
+    __slots__ = ("kind",)
+
     def __init__(self, song, chart, tick_start, kind, tick_length):
         super().__init__(song, chart, tick_start, tick_length)
         self.kind = kind  # Unused? Seems to always be 2...
@@ -79,6 +148,8 @@ class SPEvent(ChartEvent):
 
 
 class Event(ChartEvent):
+    __slots__ = ("data",)
+
     def __init__(self, song, chart, tick_start, data):
         super().__init__(song, chart, tick_start)
         self.data = data
@@ -88,6 +159,8 @@ class Event(ChartEvent):
 
 
 class Section(SongEvent):
+    __slots__ = ("text",)
+
     def __init__(self, song: Song, tick_start: int, text: str):
         super().__init__(song, tick_start)
         self.text: str = text
@@ -97,6 +170,8 @@ class Section(SongEvent):
 
 
 class LyricPhrase(SongEvent):
+    __slots__ = ("words", "word_by_ticks")
+
     def __init__(self, song: Song, tick_start: int, tick_length: int):
         super().__init__(song, tick_start, tick_length)
         self.words: List[LyricWord] = []
@@ -120,6 +195,8 @@ class LyricPhrase(SongEvent):
 
 
 class LyricWord(SongEvent):
+    __slots__ = ("text",)
+
     def __init__(self, song: Song, tick_start: int, text: str):
         super().__init__(song, tick_start)
         self.text = text
@@ -131,97 +208,273 @@ class LyricWord(SongEvent):
         return self.tick_start < other.tick_start
 
 
-class Chord(ChartEvent):
-    def __init__(self, song: Song, chart: Chart, flag: str, notes: List[Note]):
-        tick_start = notes[0].tick_start
-        tick_length = max(n.tick_length for n in notes)
-        super().__init__(song, chart, tick_start, tick_length)
-        self.flag = flag
-        self.notes = notes
-        self.frets = tuple(n.fret for n in notes)
-        self.sp_phrase: int = None
-        self.sp_start = False
-        self.sp_end = False
-        self.shape = [True if (i in self.frets) else False for i in range(5)]
+class Chord(TimedEvent):
+    """
+    A lightweight view of one row of a Chart's ChordColumns
+    Chords are only created when something asks for them
+    """
+    __slots__ = ("chart", "index")
+
+    def __init__(self, chart: Chart, index: int):
+        self.chart = chart
+        self.index = index
+
+    @property
+    def song(self) -> Song:
+        return self.chart.song
+
+    @property
+    def id(self) -> int:
+        return self.index
+
+    @property
+    def tick_start(self) -> int:
+        return int(self.chart.chord_columns.tick_start[self.index])
+
+    @property
+    def tick_length(self) -> int:
+        return int(self.chart.chord_columns.tick_length[self.index])
+
+    @property
+    def start(self) -> float:
+        return float(self.chart.chord_columns.start[self.index])
+
+    @property
+    def end(self) -> float:
+        return float(self.chart.chord_columns.end[self.index])
+
+    @property
+    def flag(self) -> str:
+        return CHORD_FLAGS[self.chart.chord_columns.flag[self.index]]
+
+    @property
+    def notes(self) -> List[Note]:
+        columns = self.chart.chord_columns
+        first, stop = columns.note_start[self.index], columns.note_stop[self.index]
+        return [Note(self.chart, i) for i in range(first, stop) if self.chart.note_columns.fret[i] not in FLAG_FRETS]
+
+    @property
+    def frets(self) -> Tuple[int]:
+        return mask_to_frets(int(self.chart.chord_columns.fret_mask[self.index]))
+
+    @property
+    def shape(self) -> Tuple[bool]:
+        return SHAPES[int(self.chart.chord_columns.fret_mask[self.index]) & 0b11111]
+
+    @property
+    def sp_phrase(self) -> Optional[int]:
+        sp_phrase = int(self.chart.chord_columns.sp_phrase[self.index])
+        return None if sp_phrase == -1 else sp_phrase
+
+    @property
+    def sp_start(self) -> bool:
+        return bool(self.chart.chord_columns.sp_start[self.index])
+
+    @property
+    def sp_end(self) -> bool:
+        return bool(self.chart.chord_columns.sp_end[self.index])
 
     def __repr__(self):
         return f"<{self.__class__.__name__}(start = {self.start}, frets = {self.frets}, length = {self.length})>"
 
 
+class NoteColumns:
+    """
+    Parallel arrays with one row per note, sorted by (tick_start, fret, tick_length)
+    start and end are filled in by Chart.calculate_times()
+    """
+    def __init__(self, tick_start: ndarray, fret: ndarray, tick_length: ndarray):
+        self.tick_start = tick_start
+        self.fret = fret
+        self.tick_length = tick_length
+        self.start: ndarray = None
+        self.end: ndarray = None
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple[int, int, int]]) -> NoteColumns:
+        table = np.array(rows, dtype=np.int64).reshape(-1, 3)
+        table = table[np.lexsort((table[:, 2], table[:, 1], table[:, 0]))]
+        return cls(table[:, 0].copy(), table[:, 1].copy(), table[:, 2].copy())
+
+    @property
+    def tick_end(self) -> ndarray:
+        return self.tick_start + self.tick_length
+
+    def __len__(self):
+        return len(self.tick_start)
+
+
+class ChordColumns:
+    """
+    Parallel arrays with one row per chord, sorted by tick_start
+    The notes of chord i are rows note_start[i]:note_stop[i] of the chart's NoteColumns
+    fret_mask has one bit set per fret in the chord, flag is an index into CHORD_FLAGS
+    and sp_phrase is -1 for chords outside of a star power phrase
+    """
+    def __init__(self, tick_start: ndarray, tick_length: ndarray, fret_mask: ndarray, flag: ndarray, note_start: ndarray, note_stop: ndarray):
+        self.tick_start = tick_start
+        self.tick_length = tick_length
+        self.fret_mask = fret_mask
+        self.flag = flag
+        self.note_start = note_start
+        self.note_stop = note_stop
+        self.sp_phrase = np.full(len(tick_start), -1, dtype=np.int32)
+        self.sp_start = np.zeros(len(tick_start), dtype=bool)
+        self.sp_end = np.zeros(len(tick_start), dtype=bool)
+        self.start: ndarray = None
+        self.end: ndarray = None
+
+    @classmethod
+    def empty(cls) -> ChordColumns:
+        ints = np.zeros(0, dtype=np.int64)
+        return cls(ints, ints, ints.astype(np.uint64), ints.astype(np.uint8), ints, ints)
+
+    @property
+    def tick_end(self) -> ndarray:
+        return self.tick_start + self.tick_length
+
+    def __len__(self):
+        return len(self.tick_start)
+
+
+class ColumnView(Sequence):
+    """
+    A read-only list of views over the rows of a column table, e.g. a list of Chords over a chart's ChordColumns
+    """
+    def __init__(self, chart: Chart, columns: str, viewclass: type):
+        self.chart = chart
+        self.columns = columns
+        self.viewclass = viewclass
+
+    def __len__(self):
+        return len(getattr(self.chart, self.columns))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.viewclass(self.chart, i) for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not (0 <= key < len(self)):
+            raise IndexError("view index out of range")
+        return self.viewclass(self.chart, key)
+
+
+class ColumnIndex(Index):
+    """
+    An nindex.Index over a sorted NumPy key column, searched with np.searchsorted instead of a tuple of keys
+    """
+    def __init__(self, items: Sequence, keys: ndarray):
+        self.items = items
+        self.keys = keys
+
+    def lteq_index(self, key) -> int:
+        index = int(np.searchsorted(self.keys, key, "right")) - 1
+        if index == -1:
+            return None
+        return index
+
+    def lt_index(self, key) -> int:
+        index = int(np.searchsorted(self.keys, key, "left")) - 1
+        if index == -1:
+            return None
+        return index
+
+    def gt_index(self, key) -> int:
+        index = int(np.searchsorted(self.keys, key, "right"))
+        if index == len(self.keys):
+            return None
+        return index
+
+    def gteq_index(self, key) -> int:
+        index = int(np.searchsorted(self.keys, key, "left"))
+        if index == len(self.keys):
+            return None
+        return index
+
+
 class Chart:
     def __init__(self, song: Song, instrument: str, difficulty: str):
         self.song = song
         self.instrument = instrument
         self.difficulty = difficulty
-        self.notes: List[Note] = []
+        self.note_columns = NoteColumns.from_rows([])
+        self.chord_columns = ChordColumns.empty()
         self.star_powers: List[SPEvent] = []
         self.events: List[Event] = []
-        self.chords: List[Chord] = []
         self.chord_by_ticks: Index[int, Chord] = None
         self.countdowns = {}  # {tickstart: ticklength}
 
+    @property
+    def notes(self) -> Sequence[Note]:
+        return ColumnView(self, "note_columns", Note)
+
+    @property
+    def chords(self) -> Sequence[Chord]:
+        return ColumnView(self, "chord_columns", Chord)
+
+    def calculate_times(self):
+        tempo_calc = self.song.tempo_calc
+        for columns in (self.note_columns, self.chord_columns):
+            columns.start = tempo_calc.ticks_to_secs_array(columns.tick_start)
+            columns.end = tempo_calc.ticks_to_secs_array(columns.tick_end)
+        tempo_calc.set_times(self.star_powers)
+        tempo_calc.set_times(self.events)
+
     def calculate_countdowns(self):
-        fakechord = Chord(self.song, self, "note", [Note(self.song, self, 0, 0, 0)])
-        if self.chords == []:
+        chords = self.chord_columns
+        if len(chords) == 0:
             return
-        for chord, nextchord in zip([fakechord] + self.chords, self.chords + [self.chords[-1]]):
-            chord_end = chord.tick_start + chord.tick_length
-            gap = nextchord.tick_start - chord_end
-            if gap >= self.song.tempo_calc.secs_to_ticks(5):  # god this is hardcoded
-                self.countdowns[chord_end] = gap
+        # The gap before each chord, starting from the beginning of the song
+        prev_ends = np.concatenate(([0], chords.tick_end[:-1]))
+        gaps = chords.tick_start - prev_ends
+        long_gaps = gaps >= self.song.tempo_calc.secs_to_ticks(5)  # god this is hardcoded
+        self.countdowns = dict(zip(prev_ends[long_gaps].tolist(), gaps[long_gaps].tolist()))
 
     def finalize(self):
-        self.notes.sort()
         self.star_powers.sort()
         self.events.sort()
-        self.chords.sort()
 
     def hopo_calc(self, song: Song):
-        for chord, prev_chord in zip(self.chords[1:], self.chords[:-1]):
-            tempo = song.tempo_calc.tempo_by_ticks.lteq(prev_chord.tick_start)
-            tempo.ticks_per_sec
-            timesig = song.timesig_by_ticks.lteq(prev_chord.tick_start)
-            if timesig is None:
-                pass
-
-            ticks_per_quarternote = song.resolution
-            ticks_per_wholenote = ticks_per_quarternote * 4
-            beats_per_wholenote = timesig.denominator
-            ticks_per_beat = ticks_per_wholenote / beats_per_wholenote
-
-            chord_distance = chord.tick_start - prev_chord.tick_start
-
-            hopo_cutoff = ticks_per_beat / (192 / 66)
-
-            if chord.frets == prev_chord.frets:
-                # You can't have two HOPO chords of the same fretting.
-                if chord.flag == "forced":
-                    chord.flag = "note"
-            elif chord_distance <= hopo_cutoff:
-                if chord.flag == "forced":
-                    chord.flag = "note"
-                elif chord.flag == "note":
-                    chord.flag = "hopo"
-            else:
-                if chord.flag == "forced":
-                    chord.flag = "hopo"
-
-        self.chord_by_ticks = Index(self.chords, "tick_start")
+        chords = self.chord_columns
+        self.chord_by_ticks = ColumnIndex(self.chords, chords.tick_start)
+        if len(chords) < 2:
+            return
+
+        prev_ticks = chords.tick_start[:-1]
+        timesig_ticks = np.array([ts.tick_start for ts in song.timesigs], dtype=np.int64)
+        denominators = np.array([ts.denominator for ts in song.timesigs] + [4], dtype=np.int64)
+        # Charts with no time signature yet are in 4/4 (index -1 picks the trailing 4)
+        beats_per_wholenote = denominators[np.searchsorted(timesig_ticks, prev_ticks, "right") - 1]
+
+        ticks_per_quarternote = song.resolution
+        ticks_per_wholenote = ticks_per_quarternote * 4
+        ticks_per_beat = ticks_per_wholenote / beats_per_wholenote
+
+        chord_distance = chords.tick_start[1:] - prev_ticks
+
+        hopo_cutoff = ticks_per_beat / (192 / 66)
+
+        flags = chords.flag[1:]
+        forced = flags == FLAG_CODES["forced"]
+        note = flags == FLAG_CODES["note"]
+        # You can't have two HOPO chords of the same fretting.
+        same_frets = chords.fret_mask[1:] == chords.fret_mask[:-1]
+        close = chord_distance <= hopo_cutoff
+
+        new_flags = flags.copy()
+        new_flags[forced & (same_frets | close)] = FLAG_CODES["note"]
+        new_flags[note & ~same_frets & close] = FLAG_CODES["hopo"]
+        new_flags[forced & ~same_frets & ~close] = FLAG_CODES["hopo"]
+        chords.flag[1:] = new_flags
 
     def sp_phrase_calc(self):
+        chords = self.chord_columns
         for i, sp_phrase in enumerate(self.star_powers):
-            p = self.chord_by_ticks[sp_phrase.tick_start:sp_phrase.tick_end]
-            if p:
-                p[0].sp_start = True
-                p[-1].sp_end = True
-            for chord in p:
-                chord.sp_phrase = i
-
-    def add_chord_ids(self):
-        id_ = -1
-        for chord in self.chords:
-            id_ += 1
-            chord.id = id_
+            first, stop = np.searchsorted(chords.tick_start, (sp_phrase.tick_start, sp_phrase.tick_end))
+            if first < stop:
+                chords.sp_start[first] = True
+                chords.sp_end[stop - 1] = True
+                chords.sp_phrase[first:stop] = i
 
     def __hash__(self):
         return hash((
@@ -266,16 +519,25 @@ class Song:
         self.events.sort()
         self.timesigs.sort()
         self.tempo_calc.finalize()
+        self.tempo_calc.set_times(self.events)
+        self.tempo_calc.set_times(self.timesigs)
+        self.tempo_calc.set_times(self.sections)
+        self.tempo_calc.set_times(self.lyrics)
+        for phrase in self.lyrics:
+            self.tempo_calc.set_times(phrase.words)
 
         self.timesig_by_ticks = Index(self.timesigs, "tick_start")
         self.lyric_by_ticks = Index(self.lyrics, "tick_start")
         self.section_by_ticks = Index(self.sections, "tick_start")
 
         for chart in self.charts.values():
-            chart.hopo_calc(self)
-            chart.calculate_countdowns()
-            chart.sp_phrase_calc()
-            chart.add_chord_ids()
+            self.finalize_chart(chart)
+
+    def finalize_chart(self, chart: Chart):
+        chart.calculate_times()
+        chart.hopo_calc(self)
+        chart.calculate_countdowns()
+        chart.sp_phrase_calc()
 
     def __hash__(self):
         return hash((
@@ -289,6 +551,8 @@ class Song:
 
 
 class TSEvent(SongEvent):
+    __slots__ = ("numerator", "denominator")
+
     def __init__(self, song: Song, tick_start: int, numerator: int, denominator: int):
         super().__init__(song, tick_start)
         self.numerator = numerator
@@ -296,6 +560,8 @@ class TSEvent(SongEvent):
 
 
 class TempoEvent(SongEvent):
+    __slots__ = ("ticks_per_sec", "mbpm")
+
     def __init__(self, song: Song, tick_start: int, ticks_per_sec: int, mbpm: float):
         super().__init__(song, tick_start)
         self.ticks_per_sec = ticks_per_sec
@@ -304,45 +570,99 @@ class TempoEvent(SongEvent):
 
 class TempoCalculator:
     def __init__(self, tempos: List[TempoEvent]):
-        self.ticks_to_secs = cache(self.ticks_to_secs)
-        self.secs_to_ticks = cache(self.secs_to_ticks)
+        self.cache_conversions()
         self.tempos = sorted(tempos)
         self.tempo_by_ticks: Index[int, TempoEvent] = None
         self.tempo_by_secs: Index[float, TempoEvent] = None
+        # Segment table, one row per tempo: where each tempo starts (in ticks and seconds) and how fast it goes
+        self.tick_starts: ndarray = None
+        self.sec_starts: ndarray = None
+        self.ticks_per_secs: ndarray = None
+        self._segments: Tuple[List[int], List[float], List[float]] = None
 
     def finalize(self):
+        self.tick_starts = np.array([t.tick_start for t in self.tempos], dtype=np.int64)
+        self.ticks_per_secs = np.array([t.ticks_per_sec for t in self.tempos], dtype=np.float64)
+        # Each tempo starts where the previous one ends; anything before the first tempo uses the first tempo
+        segment_secs = np.diff(self.tick_starts) / self.ticks_per_secs[:-1]
+        first_start = self.tick_starts[:1] / self.ticks_per_secs[:1]
+        self.sec_starts = np.cumsum(np.concatenate((first_start, segment_secs)))
+        self._segments = (self.tick_starts.tolist(), self.sec_starts.tolist(), self.ticks_per_secs.tolist())
+        self.set_times(self.tempos)
+
         self.tempo_by_ticks = Index(self.tempos, "tick_start")
         self.tempo_by_secs = Index(self.tempos, "start")
 
+    def __getstate__(self):
+        # The memoized conversion functions can't be pickled, so rebuild them on unpickle
+        state = self.__dict__.copy()
+        del state["ticks_to_secs"]
+        del state["secs_to_ticks"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cache_conversions()
+
+    def cache_conversions(self):
+        # Bounded, so feeding in a new track time every frame doesn't grow the cache forever
+        self.ticks_to_secs = lru_cache(maxsize=TEMPO_CACHE_SIZE)(self.ticks_to_secs)
+        self.secs_to_ticks = lru_cache(maxsize=TEMPO_CACHE_SIZE)(self.secs_to_ticks)
+
+    def cache_info(self):
+        """
+        Hit/miss counters for the scalar conversion caches
+        """
+        return {
+            "ticks_to_secs": self.ticks_to_secs.cache_info(),
+            "secs_to_ticks": self.secs_to_ticks.cache_info()
+        }
+
+    def ticks_to_secs_array(self, ticks: ndarray) -> ndarray:
+        ticks = np.asarray(ticks, dtype=np.int64)
+        # A tick exactly on a tempo change is the end of the previous tempo's segment
+        i = (np.searchsorted(self.tick_starts, ticks - 1, "right") - 1).clip(0)
+        secs = self.sec_starts[i] + (ticks - self.tick_starts[i]) / self.ticks_per_secs[i]
+        return np.where(ticks == 0, 0.0, secs)
+
+    def secs_to_ticks_array(self, secs: ndarray) -> ndarray:
+        secs = np.asarray(secs, dtype=np.float64)
+        i = (np.searchsorted(self.sec_starts, secs, "right") - 1).clip(0)
+        ticks = self.tick_starts[i] + np.trunc((secs - self.sec_starts[i]) * self.ticks_per_secs[i]).astype(np.int64)
+        return np.where(secs == 0, 0, ticks)
+
+    def set_times(self, events: List[SongEvent]):
+        """
+        Precalculate start and end for each event, so they don't need a tempo lookup every time they're read
+        """
+        if not events:
+            return
+        tick_starts = np.array([e.tick_start for e in events], dtype=np.int64)
+        tick_ends = np.array([e.tick_end for e in events], dtype=np.int64)
+        starts = self.ticks_to_secs_array(tick_starts).tolist()
+        ends = self.ticks_to_secs_array(tick_ends).tolist()
+        for event, start, end in zip(events, starts, ends):
+            event._start = start
+            event._end = end
+
+    # The scalar versions do the same lookups with bisect, which is much cheaper than NumPy for a single value
     def ticks_to_secs(self, ticks: int) -> float:
         if ticks is None:
             return None
         if ticks == 0:
             return 0
-        if ticks < 0:
-            curr_tempo = self.tempos[0]
-        else:
-            curr_tempo = self.tempo_by_ticks.lteq(ticks - 1)
-
-        diff_ticks = ticks - curr_tempo.tick_start
-        diff_seconds = diff_ticks / curr_tempo.ticks_per_sec
-        seconds = curr_tempo.start + diff_seconds
-        return seconds
+        tick_starts, sec_starts, ticks_per_secs = self._segments
+        i = max(bisect_right(tick_starts, ticks - 1) - 1, 0)
+        return sec_starts[i] + (ticks - tick_starts[i]) / ticks_per_secs[i]
 
     def secs_to_ticks(self, secs: float) -> int:
         if secs is None:
             return None
         if secs == 0:
             return 0
-        if secs < 0:
-            curr_tempo = self.tempos[0]
-        else:
-            curr_tempo = self.tempo_by_secs.lteq(secs)
-
-        diff_seconds = secs - curr_tempo.start
-        diff_ticks = int(diff_seconds * curr_tempo.ticks_per_sec)
-        ticks = curr_tempo.tick_start + diff_ticks
-        return int(ticks)
+        tick_starts, sec_starts, ticks_per_secs = self._segments
+        i = max(bisect_right(sec_starts, secs) - 1, 0)
+        return tick_starts[i] + int((secs - sec_starts[i]) * ticks_per_secs[i])
 
     def __hash__(self):
         return hash(tuple(self.tempos))
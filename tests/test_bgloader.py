@@ -0,0 +1,74 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+
+import pytest
+
+from charm.lib.bgloader import BackgroundLoader
+
+
+def wait_for(loader):
+    for _ in range(500):
+        if (loaded := loader.poll()) is not None:
+            return loaded
+        time.sleep(0.01)
+    raise TimeoutError
+
+
+def test_newest_load_wins():
+    release = Event()
+    loader = BackgroundLoader(ThreadPoolExecutor(max_workers=2))
+    loader.submit(lambda: release.wait() and "old", context="first")
+    loader.submit(lambda: "new", context="second")
+    assert wait_for(loader) == ("new", "second")
+    release.set()
+    assert not loader.loading
+    assert loader.poll() is None
+    loader.shutdown()
+
+
+def test_load_exception():
+    def fail():
+        raise ValueError("bad chart")
+    loader = BackgroundLoader(ThreadPoolExecutor(max_workers=1))
+    loader.submit(fail)
+    with pytest.raises(ValueError):
+        wait_for(loader)
+    assert not loader.loading
+    loader.shutdown()
+
+
+def test_prefetch():
+    calls = []
+
+    def load(name):
+        calls.append(name)
+        return name.upper()
+
+    loader = BackgroundLoader(ThreadPoolExecutor(max_workers=1), prefetch_size=2)
+    for name in ("a", "b", "c", "b"):
+        loader.prefetch(name, load, name)
+    assert list(loader.prefetched) == ["c", "b"]
+    loader.submit(load, "b", key="b", context="picked up")
+    assert wait_for(loader) == ("B", "picked up")
+    assert list(loader.prefetched) == ["c"]
+    assert calls.count("b") == 1
+    loader.shutdown()
+
+
+def test_failed_prefetch_is_retried():
+    calls = []
+
+    def load(name):
+        calls.append(name)
+        if len(calls) == 1:
+            raise OSError("not there yet")
+        return name.upper()
+
+    loader = BackgroundLoader(ThreadPoolExecutor(max_workers=1))
+    loader.prefetch("a", load, "a")
+    loader.prefetched["a"].exception()  # wait for it to fail
+    loader.submit(load, "a", key="a")
+    assert wait_for(loader) == ("A", None)
+    assert len(calls) == 2
+    loader.shutdown()
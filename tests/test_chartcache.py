@@ -0,0 +1,25 @@
+from charm.loaders import chartcache
+
+chart_path = "./charm/data/charts/hopotest/notes.chart"
+
+
+def test_cache_roundtrip(tmp_path):
+    song = chartcache.load(chart_path, cache_dir=tmp_path)
+    assert len(list(tmp_path.glob("*.pickle"))) == 1
+    cached = chartcache.load(chart_path, cache_dir=tmp_path)
+    assert repr(cached) == repr(song)
+    chords = song.charts[("Expert", "Single")].chords
+    cached_chords = cached.charts[("Expert", "Single")].chords
+    assert [(c.tick_start, c.flag, c.frets) for c in cached_chords] == [(c.tick_start, c.flag, c.frets) for c in chords]
+    assert cached.tempo_calc.ticks_to_secs(1000) == song.tempo_calc.ticks_to_secs(1000)
+
+
+def test_bad_entries_are_rebuilt(tmp_path):
+    song = chartcache.load(chart_path, cache_dir=tmp_path)
+    entry, = tmp_path.glob("*.pickle")
+    good = entry.read_bytes()
+    # A class that's since been renamed, and a half-written file
+    for bad in (b"cnosuchmodule\nSong\n.", good[:len(good) // 2]):
+        entry.write_bytes(bad)
+        assert repr(chartcache.load(chart_path, cache_dir=tmp_path)) == repr(song)
+    assert [p.name for p in tmp_path.iterdir()] == [entry.name]
@@ -0,0 +1,72 @@
+from charm.loaders import chchart
+from charm.loaders.chchart import LazyCharts, notes_to_chords
+from charm.song import CHORD_FLAGS, NoteColumns
+
+
+def test_notes_to_chords():
+    notes = NoteColumns.from_rows([
+        (0, 1, 0),
+        (0, 0, 10),
+        (0, 5, 0),
+        (192, 2, 0),
+        (192, 6, 0),
+        (384, 5, 0),
+        (576, 7, 96)
+    ])
+    chords = notes_to_chords(notes)
+    assert chords.tick_start.tolist() == [0, 192, 576]
+    assert chords.tick_length.tolist() == [10, 0, 96]
+    assert chords.fret_mask.tolist() == [0b11, 0b100, 0b10000000]
+    assert [CHORD_FLAGS[f] for f in chords.flag] == ["forced", "tap", "note"]
+    assert notes.fret[chords.note_start[0]:chords.note_stop[0]].tolist() == [0, 1, 5]
+
+
+def test_lazy_load():
+    with open("./charm/data/charts/notes/notes.chart", encoding="utf-8-sig") as f:
+        lines = f.readlines()
+    song = chchart.load(lines)
+    lazy = chchart.load(lines, lazy=True)
+    assert isinstance(lazy.charts, LazyCharts)
+    assert set(lazy.charts) == set(song.charts)
+    assert lazy.charts.loaded == {}
+    chart, lazy_chart = song.charts[("Expert", "Single")], lazy.charts[("Expert", "Single")]
+    assert list(lazy.charts.loaded) == [("Expert", "Single")]
+    assert [(c.tick_start, c.flag, c.frets, c.start) for c in lazy_chart.chords] == [(c.tick_start, c.flag, c.frets, c.start) for c in chart.chords]
+    assert lazy_chart.countdowns == chart.countdowns
+
+
+def test_load_streaming():
+    path = "./charm/data/charts/notes/notes.chart"
+    with open(path, encoding="utf-8-sig") as f:
+        song = chchart.load(f)
+    streamed = chchart.load_streaming(path)
+    assert repr(streamed) == repr(song)
+    for key, chart in song.charts.items():
+        assert [(c.tick_start, c.flag, c.frets, c.start) for c in streamed.charts[key].chords] == [(c.tick_start, c.flag, c.frets, c.start) for c in chart.chords]
+        assert [e.data for e in streamed.charts[key].events] == [e.data for e in chart.events]
+
+
+def test_load_metadata_stops_after_song_block():
+    lines = [
+        "[Song]\n",
+        "{\n",
+        "  Name = \"Title (Live)\"\n",
+        "  Artist = \"Band\"\n",
+        "  Resolution = 192\n",
+        "}\n",
+        "[SyncTrack]\n",
+        "{\n",
+        "  this line would fail to parse\n",
+        "}\n"
+    ]
+    song = chchart.load_metadata(lines)
+    assert (song.full_name, song.title, song.subtitle, song.artists, song.resolution) == ("Title (Live)", "Title ", "(Live)", "Band", 192)
+    assert song.charts == {}
+
+
+def test_load_metadata_ini_fallback():
+    with open("./charm/data/charts/notes/notes.chart", encoding="utf-8-sig") as f:
+        assert chchart.load_metadata(f).full_name is None
+        f.seek(0)
+        song = chchart.load_metadata(f, ini_path="./charm/data/charts/notes/song.ini")
+    assert (song.title, song.artists, song.charter) == ("Example Chart", "Super Mario Bros. 1", "DigiDuncan")
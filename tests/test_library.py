@@ -0,0 +1,26 @@
+import shutil
+
+from charm.loaders.library import SongLibrary
+
+chart_path = "./charm/data/charts/hopotest/notes.chart"
+
+
+def test_library_refresh(tmp_path):
+    songs_root = tmp_path / "songs"
+    (songs_root / "hopotest").mkdir(parents=True)
+    chart = songs_root / "hopotest" / "notes.chart"
+    shutil.copy(chart_path, chart)
+
+    library = SongLibrary(tmp_path / "library.db")
+    [song] = library.refresh(songs_root)
+    assert (song["title"], song["resolution"]) == ("HOPO Test", 480)
+    assert library.charts(chart) == {("Expert", "Single"): 47}
+
+    chart.write_text(chart.read_text(encoding="utf-8-sig").replace("HOPO Test", "HOPO Retest"), encoding="utf-8")
+    [song] = library.refresh(songs_root)
+    assert song["title"] == "HOPO Retest"
+
+    chart.unlink()
+    assert library.refresh(songs_root) == []
+    assert library.charts(chart) == {}
+    library.close()
@@ -0,0 +1,47 @@
+import numpy as np
+import pygame
+from pygame.constants import SRCALPHA
+
+from charm.lib.pgutils import Quad, Warper, channel_order, warp_surface, write_bgr
+
+
+def to_rgba(surf):
+    w, h = surf.get_size()
+    return np.frombuffer(pygame.image.tobytes(surf, "RGBA"), np.uint8).reshape(h, w, 4).astype(int)
+
+
+def test_warper_matches_warp_surface():
+    w, h = 64, 48
+    surf = pygame.Surface((w, h), SRCALPHA)
+    surf.fill((0, 0, 0, 0))
+    pygame.draw.rect(surf, (255, 0, 0, 255), (8, 8, 20, 30))
+    pygame.draw.circle(surf, (0, 128, 255, 128), (44, 24), 12)
+    src = Quad((0, 0), (w, 0), (w, h), (0, h))
+    dst = Quad((w * 0.25, h / 2.5), (w * 0.75, h / 2.5), (w, h), (0, h))
+    warper = Warper((w, h), src, dst)
+    warped = warper.warp(surf)
+    assert np.abs(to_rgba(warped) - to_rgba(warp_surface(surf, src, dst))).max() <= 8
+    # The output surface is reused
+    assert warper.warp(surf) is warped
+
+
+def test_warp_surface_reuses_out():
+    surf = pygame.Surface((32, 32), SRCALPHA)
+    surf.fill((255, 0, 0, 255))
+    quad = Quad((0, 0), (32, 0), (32, 32), (0, 32))
+    out = warp_surface(surf, quad, quad)
+    assert to_rgba(out)[16, 16].tolist() == [255, 0, 0, 255]
+    surf.fill((0, 255, 0, 255))
+    assert warp_surface(surf, quad, quad, out) is out
+    assert to_rgba(out)[16, 16].tolist() == [0, 255, 0, 255]
+
+
+def test_write_bgr():
+    frame = np.zeros((3, 4, 3), np.uint8)
+    frame[..., 0] = 200
+    frame[1, 2] = (1, 2, 3)
+    for surf in (pygame.Surface((4, 3), 0, 32), pygame.Surface((4, 3), SRCALPHA)):
+        write_bgr(frame, surf)
+        assert surf.get_at((0, 0)) == (0, 0, 200, 255)
+        assert surf.get_at((2, 1)) == (3, 2, 1, 255)
+    assert channel_order(pygame.Surface((4, 3), SRCALPHA)) in ("BGRA", "RGBA")
@@ -0,0 +1,80 @@
+import pytest
+
+from charm.loaders.raw_chchart import DuplicateBlockException, RawNote, load_raw, parse_line, parse_line_fast, stream_raw
+
+lines = [
+    "  Resolution = 192\n",
+    "  Name = \"Soulless 5\"\n",
+    "  MusicStream = \"song.ogg\"\r\n",
+    "  768 = N 0 0\n",
+    "  768 = N 5 0\n",
+    "768=N 2 192",
+    "  768 = N 2\n",
+    "  768 = N 2 192 7\n",
+    "  768 = N2 192\n",
+    "  768 = N -1 0\n",
+    "  0 = B 120000\n",
+    "  0 = A 500000\n",
+    "  0 = TS 4\n",
+    "  0 = TS 7 3\n",
+    "  0 = TS 7 3 1\n",
+    "  1536 = S 2 3072\n",
+    "  1536 = E solo\n",
+    "  1536 = E \"section Verse 1\"\n",
+    "  1536 = E \"lyric Hel-\"\n",
+    "  1536 = E \"lyric \"\n",
+    "  1536 = E \"phrase_start\"\n",
+    "  1536 = E \"phrase_end\"\n",
+    "  1536 = E \"phrase_start\" extra\n",
+    "  1536 = E\"section Verse 1\"\n",
+    "  1536 = X 0 0\n",
+    "  1536 N 0 0\n",
+    "  12a = N 0 0\n",
+    "  = N 0 0\n",
+    "\n",
+    "",
+]
+
+
+@pytest.mark.parametrize("line", lines)
+def test_parse_line_fast(line):
+    expected = parse_line(line)
+    parsed = parse_line_fast(line)
+    assert type(parsed) is type(expected)
+    assert parsed == expected
+
+
+block_lines = [
+    "[Song]\n",
+    "{\n",
+    "  Resolution = 192\n",
+    "}\n",
+    "[ExpertSingle]\n",
+    "{\n",
+    "  0 = N 0 0\n",
+    "  192 = N 1 0\n",
+    "}\n",
+    "[HardSingle]\n",
+    "{\n",
+    "  0 = N 2 0\n",
+    "}\n"
+]
+
+
+def test_stream_raw():
+    assert [(header, list(lines)) for header, lines in stream_raw(block_lines)] == list(load_raw(block_lines).items())
+
+
+def test_stream_raw_skips_unread_lines():
+    blocks = stream_raw(block_lines)
+    assert next(blocks)[0] == "Song"
+    header, lines = next(blocks)
+    assert (header, next(lines)) == ("ExpertSingle", RawNote(0, 0, 0))
+    header, lines = next(blocks)
+    assert (header, list(lines)) == ("HardSingle", [RawNote(0, 2, 0)])
+
+
+def test_stream_raw_duplicate_block():
+    with pytest.raises(DuplicateBlockException):
+        for header, lines in stream_raw(block_lines + block_lines[4:9]):
+            pass
@@ -0,0 +1,100 @@
+import pytest
+
+from charm.lib.instruments.guitar import StrumEvent
+from charm.lib.instruments.replay import BadReplayException
+from charm.loaders import chchart
+from charm.prototyping.hitdetection.replay import batch_judgements, score_replay
+from charm.prototyping.hitdetection.scorecalculator import batch_hits
+
+
+def load_chart():
+    with open("./charm/data/charts/notes/notes.chart", encoding="utf-8-sig") as f:
+        song = chchart.load(f)
+    return song.charts[("Expert", "Single")]
+
+
+def split_open(chart):
+    # Open notes can't be hit yet, anchored_shape has nothing to anchor on
+    chords = [chord for chord in chart.chords if chord.frets != (7,)]
+    return chords, len(chart.chords) - len(chords)
+
+
+def strum(chord, offset=0):
+    if len(chord.notes) > 1:
+        shape = tuple(chord.shape)
+    else:
+        shape = tuple(fret == chord.notes[0].fret for fret in range(5))
+    return StrumEvent(chord.start + offset, True, shape)
+
+
+def test_replay_perfect():
+    chart = load_chart()
+    chords, opens = split_open(chart)
+    result = score_replay(chart, [strum(chord) for chord in chords])
+    assert result.judgements["supercharming"] == len(chords)
+    assert result.judgements["miss"] == opens
+    assert result.overstrums == 0
+    assert result.streak_history[-1][1:] == (result.score, result.streak)
+
+
+def test_replay_nothing():
+    chart = load_chart()
+    result = score_replay(chart, [])
+    assert result.score == result.best_streak == 0
+    assert result.judgements["miss"] == len(chart.chords)
+
+
+def test_replay_late_and_extra():
+    chart = load_chart()
+    chords, opens = split_open(chart)
+    events = [strum(chords[0], 0.03), strum(chords[0], 0.04)] + [strum(chord) for chord in chords[1:]]
+    result = score_replay(chart, events)
+    assert result.judgements["excellent"] == 1
+    assert result.judgements["supercharming"] == len(chords) - 1
+    assert result.judgements["miss"] == opens
+    assert result.overstrums == 1
+
+
+def test_batch_hits():
+    # Chords: a green note, a red+yellow chord, and a green note nobody hits
+    chord_starts = [1.0, 2.0, 3.0]
+    chord_masks = [0b1, 0b110, 0b1]
+    chord_sizes = [1, 2, 1]
+    # Inputs: green+red anchors on red (no hit), green hits, a red+yellow strum too early, one in time, a spare
+    input_times = [0.95, 0.96, 1.92, 1.98, 2.01]
+    input_masks = [0b11, 0b1, 0b110, 0b110, 0b110]
+    chord_input, input_chord = batch_hits(chord_starts, chord_masks, chord_sizes, input_times, input_masks)
+    assert chord_input.tolist() == [1, 3, -1]
+    assert input_chord.tolist() == [-1, 0, -1, 1, -1]
+
+
+def test_batch_matches_replay():
+    chart = load_chart()
+    chords, _ = split_open(chart)
+    events = []
+    for i, chord in enumerate(chords):
+        events.append(strum(chord, (i % 7 - 3) / 50))
+        events.append(strum(chords[(i + 1) % len(chords)], (i % 5 - 2) / 40))
+    events.sort(key=lambda e: e.tracktime)
+    result = score_replay(chart, events)
+    assert batch_judgements(chart, events) == (result.judgements, result.overstrums)
+
+
+def test_replay_bad_times():
+    chart = load_chart()
+    chords, _ = split_open(chart)
+    for bad in (float("nan"), float("inf"), -1):
+        with pytest.raises(BadReplayException):
+            score_replay(chart, [strum(chords[0]), StrumEvent(bad, True, (True, False, False, False, False))])
+    with pytest.raises(BadReplayException):
+        score_replay(chart, [strum(chords[1]), strum(chords[0])])
+
+
+def test_replay_past_the_end():
+    chart = load_chart()
+    chords, opens = split_open(chart)
+    events = [strum(chord) for chord in chords] + [StrumEvent(1e9, True, (True, False, False, False, False))]
+    result = score_replay(chart, events)
+    assert result.judgements["supercharming"] == len(chords)
+    assert result.overstrums == 1
+    assert batch_judgements(chart, events) == (result.judgements, result.overstrums)
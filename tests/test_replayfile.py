@@ -0,0 +1,84 @@
+import pytest
+
+from charm.lib.instruments.guitar import FretEvent, JoyEvent, StarEvent, StrumEvent, WhammyMotion
+from charm.lib.instruments.instrument import Instrument
+from charm.lib.instruments.replay import MAGIC, VERSION, BadReplayException, ReplayException, ReplayInstrument, ReplayRecorder, read_replay
+
+shape = (True, False, True, False, False)
+
+
+def record(events):
+    instrument = Instrument(None)
+    recorder = ReplayRecorder()
+    recorder.attach(instrument)
+    for event in events:
+        instrument.add_event(event)
+    return recorder
+
+
+def describe(event):
+    return type(event), event.name, getattr(event, "shape", None), getattr(event, "fretnum", None), getattr(event, "direction", None)
+
+
+def test_roundtrip():
+    events = [
+        FretEvent(0.5, True, 1, (True, False, False, False, False)),
+        FretEvent(0.5, True, 3, shape),
+        StrumEvent(0.516666, True, shape),
+        JoyEvent(0.516666, True, "DOWN"),
+        StrumEvent(0.55, False, shape),
+        StarEvent(12.25, True),
+        WhammyMotion(13.0, 0.5),
+        StrumEvent(2.0, True, shape)  # rewound
+    ]
+    replayed = list(read_replay(bytes(record(events).buffer)))
+    assert [describe(e) for e in replayed] == [describe(e) for e in events]
+    for event, replay in zip(events, replayed):
+        assert event.tracktime - 1e-6 < replay.tracktime <= event.tracktime
+    assert replayed[6].position == pytest.approx(0.5, abs=1e-4)
+
+
+def test_compact():
+    # A strum with a fret press and release around it every 100ms for 10 minutes
+    events = []
+    for i in range(6000):
+        t = i / 10
+        events += [FretEvent(t, True, 3, shape), StrumEvent(t + 0.01, True, shape), FretEvent(t + 0.05, False, 3, shape)]
+    assert len(record(events).buffer) < 100_000
+
+
+def test_bad_replay():
+    with pytest.raises(BadReplayException):
+        list(read_replay(b"nope"))
+    data = bytes(record([StrumEvent(1, True, shape)]).buffer)
+    with pytest.raises(BadReplayException):
+        list(read_replay(data[:-1]))
+    header = MAGIC + bytes([VERSION])
+    for bad in (
+        b"\xff" * 20 + b"\x01",  # endless time change
+        b"\x00\x07",  # no such event type
+        b"\x00\xf0\x01",  # fret 15
+        b"\x00\x01\x40",  # strum with a sixth fret
+        b"\x00\x52"  # star power with a fret number
+    ):
+        with pytest.raises(BadReplayException):
+            list(read_replay(header + bad))
+
+
+def test_unrecordable():
+    recorder = ReplayRecorder()
+    for event in (FretEvent(1, True, 16, shape), StrumEvent(1e9, True, shape)):
+        with pytest.raises(ReplayException):
+            recorder.record(event)
+    # Nothing half-written
+    assert recorder.count == 0 and len(recorder.buffer) == len(MAGIC) + 1
+
+
+def test_replay_instrument():
+    events = [StrumEvent(t, True, shape) for t in (0.1, 0.2, 0.3)]
+    instrument = ReplayInstrument(read_replay(bytes(record(events).buffer)))
+    instrument.update(0.2)
+    assert [e.tracktime for e in instrument.get_events()] == [0.1, 0.2]
+    instrument.update(1)
+    assert len(instrument.get_events()) == 1
+    assert instrument.finished
@@ -0,0 +1,52 @@
+import pygame
+from pygame.constants import SRCALPHA
+
+from charm.prototyping.notedisplay.spriteloader import Sprite, SpriteSheet
+
+
+def make_sheet(stretched_size=256):
+    sprites = []
+    for mode in ("note", "sustainbody"):
+        img = pygame.Surface((64, 64), SRCALPHA)
+        img.fill((0, 255, 0, 200))
+        sprites.append(Sprite("green", 0, mode, False, False, img))
+    return SpriteSheet(sprites, stretched_size=stretched_size)
+
+
+def test_variants_leave_sprite_alone():
+    sheet = make_sheet()
+    sprite = sheet.get(fretnum=0)
+    assert sheet.get(fretnum=0, alpha=255) is sprite
+    faded = sheet.get(fretnum=0, alpha=127.5)
+    assert faded is not sprite
+    assert faded.get_at((0, 0)).a in range(96, 105)
+    assert sprite.get_at((0, 0)).a == 200
+    assert sprite.get_alpha() in (None, 255)
+    # Close enough fades share one variant
+    assert sheet.get(fretnum=0, alpha=128) is faded
+    assert sheet.cache_info()[:2] == (1, 1)
+
+
+def test_variant_sizes_and_eviction():
+    sheet = make_sheet(stretched_size=2)
+    faded = sheet.get(fretnum=0, mode="sustainbody", alpha=100)
+    body = sheet.get(fretnum=0, mode="sustainbody", width=97, height=300)
+    assert body.get_size() == (96, 300)
+    sheet.get(fretnum=0, mode="sustainbody", height=200)
+    sheet.get(fretnum=0, mode="sustainbody", height=100)
+    info = sheet.stretched.info()
+    assert (info.misses, info.evictions, info.size) == (3, 1, 2)
+    # The oldest went first, but stretching doesn't push fades out
+    assert sheet.get(fretnum=0, mode="sustainbody", width=97, height=300) is not body
+    assert sheet.get(fretnum=0, mode="sustainbody", alpha=100) is faded
+    assert sheet.cache_info().hits == 1
+
+
+def test_extend_repeats_bottom_row():
+    sheet = make_sheet()
+    body = sheet.get(fretnum=0, mode="sustainbody")
+    body.fill((255, 0, 0, 255), (0, 0, 64, 32))
+    strip = sheet.get(fretnum=0, mode="sustainbody", height=500, extend=True)
+    assert strip.get_size() == (64, 500)
+    assert strip.get_at((10, 10)) == (255, 0, 0, 255)
+    assert strip.get_at((10, 63)) == strip.get_at((10, 499)) == (0, 255, 0, 200)
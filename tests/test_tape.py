@@ -1,4 +1,4 @@
-from charm.lib.tape import BufferedTape, Tape
+from charm.lib.tape import BufferedTape, Tape, WindowedTape
 
 
 class Event:
@@ -58,3 +58,36 @@ def test_bufferedtaperewind():
     assert tape.current_items == chords
     tape.set_position(0)
     assert tape.current_items == chords[:1]
+
+
+def test_windowedtape():
+    tape = WindowedTape(chords, "start", 1.1)
+    tape.set_position(0)
+    assert tape.current_items == [chords[0]]
+    tape.set_position(1)
+    assert tape.current_items == chords[:2]
+    tape.set_position(5)
+    assert tape.current_items == []
+
+
+def test_windowedtaperewind():
+    tape = WindowedTape(chords, "start", 1.1)
+    tape.set_position(2)
+    assert tape.current_items == chords
+    tape.set_position(0)
+    assert tape.current_items == chords[:1]
+
+
+def test_windowedtapeexpire():
+    expired = []
+
+    class ExpiringTape(WindowedTape):
+        def expire(self, start, stop):
+            expired.extend(self.items[start:stop])
+
+    tape = ExpiringTape(chords, "start", 0.5)
+    tape.set_position(2)
+    assert expired == chords[:1]
+    tape.set_position(0)
+    tape.set_position(10)
+    assert expired == chords[:1] + chords
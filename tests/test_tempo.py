@@ -0,0 +1,49 @@
+import numpy as np
+
+from charm.song import TEMPO_CACHE_SIZE, TempoCalculator, TempoEvent
+
+
+def make_tempo_calc():
+    # 192 ticks/sec until tick 384, then 384 ticks/sec
+    tempo_calc = TempoCalculator([TempoEvent(None, 0, 192, 60000), TempoEvent(None, 384, 384, 120000)])
+    tempo_calc.finalize()
+    return tempo_calc
+
+
+def test_ticks_to_secs():
+    tempo_calc = make_tempo_calc()
+    assert tempo_calc.ticks_to_secs(0) == 0
+    assert tempo_calc.ticks_to_secs(192) == 1.0
+    assert tempo_calc.ticks_to_secs(384) == 2.0
+    assert tempo_calc.ticks_to_secs(768) == 3.0
+    assert tempo_calc.ticks_to_secs(-192) == -1.0
+
+
+def test_secs_to_ticks():
+    tempo_calc = make_tempo_calc()
+    assert tempo_calc.secs_to_ticks(0) == 0
+    assert tempo_calc.secs_to_ticks(1.0) == 192
+    assert tempo_calc.secs_to_ticks(2.5) == 576
+
+
+def test_arrays_match_scalars():
+    tempo_calc = make_tempo_calc()
+    ticks = np.arange(-10, 1000, 7)
+    assert tempo_calc.ticks_to_secs_array(ticks).tolist() == [tempo_calc.ticks_to_secs(t) for t in ticks.tolist()]
+    secs = np.linspace(-1, 5, 301)
+    assert tempo_calc.secs_to_ticks_array(secs).tolist() == [tempo_calc.secs_to_ticks(s) for s in secs.tolist()]
+
+
+def test_tempo_starts():
+    tempo_calc = make_tempo_calc()
+    assert [t.start for t in tempo_calc.tempos] == [0.0, 2.0]
+
+
+def test_cache_is_bounded():
+    tempo_calc = make_tempo_calc()
+    for frame in range(TEMPO_CACHE_SIZE * 3):
+        tempo_calc.secs_to_ticks(frame / 120)
+        tempo_calc.secs_to_ticks(frame / 120)
+    info = tempo_calc.cache_info()["secs_to_ticks"]
+    assert info.currsize == TEMPO_CACHE_SIZE
+    assert info.hits == info.misses == TEMPO_CACHE_SIZE * 3